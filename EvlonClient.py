@@ -1,17 +1,37 @@
 #Unauthorized reproduction prohibited/無断転載禁止
+import time
+STARTUP_STARTED = time.perf_counter()
 import tkinter as tk
+import tkinter.font
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk, ImageDraw
-from pystray import MenuItem as item, Icon
 import threading
-from pynput import keyboard
-import psutil
+import importlib
 from datetime import datetime
 import json
 import os
+import csv
+import mmap
+import queue
+import struct
+import fnmatch
+import bisect
 import sys
-import shutil
-import time
+import math
+from array import array
+from collections import deque, namedtuple
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None: self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+# psutil is only needed once sampling starts, so keep it off the startup path.
+psutil = LazyModule("psutil")
+IMPORTS_DONE = time.perf_counter()
 
 COLOR_THEMES = {
     "標準 (灰色)": {"bg": "#222222", "fg": "white"},
@@ -36,12 +56,135 @@ DEFAULT_SETTINGS = {
     "show_battery": True,
     "show_voltage": False,
     "show_amperage": False,
+    "show_throttle": True,
+    "throttle_ratio": 0.7,
+    "throttle_min_cpu": 50.0,
+    "throttle_temp": 90.0,
+    "show_graphs": False,
+    "graph_points": 60,
+    "show_details": False,
+    "nic_filter": "",
+    "spike_capture": False,
+    "spike_sample_ms": 75,
+    "spike_cpu_threshold": 90.0,
+    "spike_disk_mb_s": 150.0,
+    "spike_pre_seconds": 1.0,
+    "spike_post_seconds": 0.5,
+    "spike_cpu_budget": 2.0,
+    "record_sessions": False,
+    "record_batch": 30,
+    "record_max_mb": 16,
+    "show_debug": False,
+    "stats_log": False,
+    "stats_log_interval": 10.0,
+    "cpu_budget_percent": 1.0,
+    "export_http": False,
+    "export_port": 9465,
+    "export_shared_memory": False,
+    "priority_manager": False,
+    "priority_rules": [],
+    "priority_scan_interval": 3.0,
+    "host_viewer": False,
+    "host_viewer_port": 9466,
+    "host_viewer_bind": "0.0.0.0",
+    "host_stale_periods": 3.0,
+    "agent_interval": 0.5,
+    "agent_batch": 2,
+    "agent_keyframe_every": 10,
+    "alerts_enabled": True,
+    "alert_notifications": True,
+    "alert_background": False,
+    "alert_rules": ["temp > 90 for 5 clear 85 crit notify", "ram > 90 for 10 clear 85", "battery < 15 clear 20 notify"],
     "theme": "標準 (灰色)",
     "update_interval": 2.0,
+    "battery_interval_scale": 2.0,
+    "min_update_interval": 0.5,
+    "background_interval_scale": 2.0,
+    "max_update_interval": 10.0,
 }
 
-APP_DATA_PATH = os.path.join(os.getenv('APPDATA'), 'EvlonClient')
+APP_DATA_PATH = os.path.join(os.getenv('APPDATA') or os.path.join(os.path.expanduser('~'), '.config'), 'EvlonClient')
 CONFIG_FILE = os.path.join(APP_DATA_PATH, 'config.json')
+SESSIONS_PATH = os.path.join(APP_DATA_PATH, 'sessions')
+STATS_FILE = os.path.join(APP_DATA_PATH, 'stats.log')
+STARTUP_FILE = os.path.join(APP_DATA_PATH, 'startup.json')
+
+# Every numeric setting is clamped: runtime code divides by, sleeps on or sizes buffers with these values.
+SETTING_LIMITS = {
+    "alpha": (0.1, 1.0), "font_size": (8, 24), "graph_points": (10, 300),
+    "throttle_ratio": (0.1, 1.0), "throttle_min_cpu": (0.0, 100.0), "throttle_temp": (40.0, 120.0),
+    "spike_sample_ms": (50, 100), "spike_cpu_threshold": (10.0, 100.0), "spike_disk_mb_s": (1.0, 10000.0),
+    "spike_pre_seconds": (0.1, 10.0), "spike_post_seconds": (0.1, 10.0), "spike_cpu_budget": (0.1, 50.0),
+    "record_batch": (1, 1000), "record_max_mb": (1, 1024),
+    "stats_log_interval": (1.0, 3600.0), "cpu_budget_percent": (0.1, 100.0), "priority_scan_interval": (0.5, 60.0),
+    "update_interval": (0.1, 60.0), "min_update_interval": (0.1, 60.0), "max_update_interval": (0.1, 60.0),
+    "battery_interval_scale": (1.0, 20.0), "background_interval_scale": (1.0, 20.0),
+    "export_port": (1, 65535), "host_viewer_port": (1, 65535), "host_stale_periods": (1.0, 100.0),
+    "agent_interval": (0.1, 60.0), "agent_batch": (1, 255), "agent_keyframe_every": (1, 1000),
+}
+SETTING_CHOICES = {"theme": COLOR_THEMES, "time_format": ("12h", "24h")}
+
+def validate_settings(user_settings):
+    # Keys missing from DEFAULT_SETTINGS are dropped; values of the wrong type or choice fall back to the default.
+    settings = {key: list(value) if isinstance(value, list) else value for key, value in DEFAULT_SETTINGS.items()}
+    if not isinstance(user_settings, dict): return settings
+    for key, default in DEFAULT_SETTINGS.items():
+        if key not in user_settings: continue
+        value = user_settings[key]
+        if isinstance(default, bool): valid = isinstance(value, bool)
+        elif isinstance(default, (int, float)):
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+            if valid: value = type(default)(value)
+        elif isinstance(default, list): valid = isinstance(value, list) and all(isinstance(item, str) for item in value)
+        else: valid = isinstance(value, type(default))
+        if valid and key in SETTING_CHOICES: valid = value in SETTING_CHOICES[key]
+        if not valid:
+            print(f"Ignoring invalid setting {key}: {value!r}")
+            continue
+        if key in SETTING_LIMITS: value = min(max(value, SETTING_LIMITS[key][0]), SETTING_LIMITS[key][1])
+        settings[key] = value
+    return settings
+
+class SettingsStore:
+    # Saves are coalesced: the newest copy is written by one background thread once changes settle for `delay`
+    # seconds, through a temp file and os.replace so a crash never leaves a half-written config.json.
+    def __init__(self, path=CONFIG_FILE, delay=0.5):
+        self.path = path
+        self.delay = delay
+        self.pending = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def save(self, settings):
+        with self._lock:
+            self.pending = {key: list(value) if isinstance(value, list) else value for key, value in settings.items()}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="settings-writer", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while self._wake.wait(self.delay): self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock: settings, self.pending = self.pending, None
+            if settings is None: return
+            temp_path = f"{self.path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(settings, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e: print(f"Settings save error: {e}")
 
 def resource_path(relative_path):
     try:
@@ -52,16 +195,1550 @@ def resource_path(relative_path):
 
 ICON_PATH = resource_path("EC.ico")
 
-class ScreenOverlayApp:
+class LatencyHistogram:
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self):
+        self.counts = array('L', [0]) * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+
+    def percentile(self, fraction):
+        if not self.count: return 0.0
+        target, seen = fraction * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target: return min(self.BOUNDS[index], self.max) if index < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                "p50_ms": self.percentile(0.5) * 1000, "p95_ms": self.percentile(0.95) * 1000, "max_ms": round(self.max * 1000, 3)}
+
+class Instrumentation:
     def __init__(self):
+        self.histograms = {}
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None: histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.record(seconds)
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in list(self.histograms.items())}
+
+class MetricCollector:
+    def __init__(self, name, func, setting=None, interval_scale=1.0, timeout=1.0):
+        self.name = name
+        self.func = func
+        self.setting = setting
+        self.interval_scale = interval_scale
+        self.interval = DEFAULT_SETTINGS["update_interval"] * interval_scale
+        self.timeout = timeout
+        self.enabled = True
+        self.latest = None
+        self.wake = threading.Event()
+
+    def sample(self):
+        try: value = self.func()
+        except Exception: value = None
+        # Published as one tuple so readers never need a lock.
+        self.latest = (time.monotonic(), value)
+
+    def read(self, now):
+        latest = self.latest
+        if latest is None or now - latest[0] > self.interval + self.timeout: return None
+        return latest[1]
+
+class NetRateMeter:
+    def __init__(self, provider=psutil):
+        self.psutil = provider
+        self.last = None
+
+    def __call__(self):
+        counters = self.psutil.net_io_counters()
+        now = time.monotonic()
+        last, self.last = self.last, (now, counters)
+        if last is None or now <= last[0]: return None
+        elapsed = now - last[0]
+        sent_speed = (counters.bytes_sent - last[1].bytes_sent) * 8 / elapsed
+        recv_speed = (counters.bytes_recv - last[1].bytes_recv) * 8 / elapsed
+        return sent_speed, recv_speed
+
+SYSFS_ROOT = "/sys"
+# Preferred CPU sensors, best first; other chips are only used when their name mentions the CPU.
+TEMP_CHIPS = ("coretemp", "k10temp", "zenpower", "k8temp", "cpu_thermal", "soc_thermal", "acpitz")
+TEMP_LABELS = ("Package id 0", "Tdie", "Tctl", "Tccd1", "CPU", "")
+
+class SysfsValue:
+    # The file stays open; each read is one pread from offset 0, which makes sysfs regenerate the value.
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        return int(os.pread(self.fd, 64, 0))
+
+    def close(self):
+        try: os.close(self.fd)
+        except OSError: pass
+
+def read_sysfs_text(path):
+    with open(path) as f: return f.read().strip()
+
+class TemperatureSensor:
+    # Probes all chips once and keeps the chosen sensor; a failed read drops it so the next call re-probes.
+    def __init__(self, provider=psutil, sysfs=None, retry_after=60.0):
+        self.psutil = provider
+        self.sysfs = sysfs
+        self.retry_after = retry_after
+        self.source = None
+        self.file = None
+        self.description = None
+        self.next_probe = 0.0
+
+    def __call__(self):
+        if self.source is None:
+            if time.monotonic() < self.next_probe: return None
+            self.probe()
+            if self.source is None:
+                self.next_probe = time.monotonic() + self.retry_after
+                return None
         try:
-            p = psutil.Process(os.getpid())
-            if os.name == 'nt':
-                p.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
-        except Exception as e:
-            print(f"Priority error: {e}")
-        
-        self.settings = self.load_settings()
+            if self.file: return self.file.read() / 1000
+            chip, index = self.source
+            return self.psutil.sensors_temperatures()[chip][index].current
+        except (OSError, ValueError, KeyError, IndexError, AttributeError):
+            self.reset()
+            return None
+
+    def reset(self):
+        if self.file: self.file.close()
+        self.source = self.file = self.description = None
+
+    def probe(self):
+        try: temps = self.psutil.sensors_temperatures() or {}
+        except Exception: temps = {}
+        best = None
+        for chip, entries in temps.items():
+            if chip not in TEMP_CHIPS and "cpu" not in chip.lower(): continue
+            chip_rank = TEMP_CHIPS.index(chip) if chip in TEMP_CHIPS else len(TEMP_CHIPS)
+            for index, entry in enumerate(entries):
+                if entry.current is None or not 0 < entry.current < 150: continue
+                label_rank = TEMP_LABELS.index(entry.label) if entry.label in TEMP_LABELS else len(TEMP_LABELS)
+                rank = (chip_rank, label_rank, index)
+                if best is None or rank < best[0]: best = (rank, chip, index, entry)
+        if best is None: return
+        _, chip, index, entry = best
+        self.source = (chip, index)
+        self.description = f"{chip}/{entry.label or index}"
+        if self.sysfs: self.file = self.open_sysfs(chip, index, entry)
+        if self.file: self.description += " (sysfs)"
+
+    def open_sysfs(self, chip, index, entry):
+        # psutil lists hwmon inputs per chip name in path order; prefer matching by label, check the value agrees.
+        hwmon = os.path.join(self.sysfs, "class", "hwmon")
+        inputs = []
+        try:
+            for device in sorted(os.listdir(hwmon)):
+                base = os.path.join(hwmon, device)
+                try:
+                    if read_sysfs_text(os.path.join(base, "name")) != chip: continue
+                    names = sorted((name for name in os.listdir(base) if name.startswith("temp") and name.endswith("_input")), key=lambda name: int(name[4:-6]))
+                except (OSError, ValueError): continue
+                inputs += [os.path.join(base, name) for name in names]
+        except OSError: return None
+        candidates = [path for path in inputs if os.path.exists(path[:-6] + "_label") and read_sysfs_text(path[:-6] + "_label") == entry.label] if entry.label else []
+        if not candidates and index < len(inputs): candidates = [inputs[index]]
+        for path in candidates:
+            try:
+                value = SysfsValue(path)
+                if abs(value.read() / 1000 - entry.current) <= 5: return value
+                value.close()
+            except (OSError, ValueError): pass
+        return None
+
+FreqState = namedtuple("FreqState", "current max ratio")
+
+class CpuFreqMeter:
+    # On Linux scaling_cur_freq of every cpufreq policy stays open; the ratio is averaged per policy so
+    # hybrid CPUs with lower-clocked efficiency cores do not look throttled.
+    def __init__(self, provider=psutil, sysfs=None):
+        self.psutil = provider
+        self.sysfs = sysfs
+        self.files = None
+        self.max_freqs = []
+
+    def __call__(self):
+        if self.files is None: self.discover()
+        if self.files:
+            try: current = [value.read() / 1000 for value in self.files]
+            except (OSError, ValueError):
+                for value in self.files: value.close()
+                self.files = None
+            else:
+                ratio = sum(freq / top for freq, top in zip(current, self.max_freqs)) / len(current)
+                return FreqState(sum(current) / len(current), max(self.max_freqs), ratio)
+        freq = self.psutil.cpu_freq()
+        if not freq: return None
+        return FreqState(freq.current, freq.max, freq.current / freq.max if freq.max else None)
+
+    def discover(self):
+        self.files, self.max_freqs = [], []
+        if not self.sysfs: return
+        cpufreq = os.path.join(self.sysfs, "devices", "system", "cpu", "cpufreq")
+        try: policies = sorted(name for name in os.listdir(cpufreq) if name.startswith("policy"))
+        except OSError: return
+        for policy in policies:
+            base = os.path.join(cpufreq, policy)
+            try:
+                top = int(read_sysfs_text(os.path.join(base, "cpuinfo_max_freq"))) / 1000
+                if top <= 0: continue
+                self.files.append(SysfsValue(os.path.join(base, "scaling_cur_freq")))
+                self.max_freqs.append(top)
+            except (OSError, ValueError): pass
+
+def detect_throttling(snapshot, settings):
+    freq, cpu = snapshot.get("freq"), snapshot.get("cpu")
+    if not freq or freq.ratio is None or cpu is None or cpu < settings.get("throttle_min_cpu", 50.0): return None
+    if freq.ratio >= settings.get("throttle_ratio", 0.7): return None
+    temp = snapshot.get("temp")
+    return "thermal" if temp is not None and temp >= settings.get("throttle_temp", 90.0) else "power limit"
+
+PowerState = namedtuple("PowerState", "voltage current power")
+POWER_FILES = ("voltage_now", "current_now", "power_now")
+
+class BatteryPowerMeter:
+    # Linux only: reads voltage_now (µV), current_now (µA) and power_now (µW) of the system battery
+    # through cached handles; the battery is re-discovered only after a read fails.
+    def __init__(self, sysfs=None, retry_after=60.0):
+        self.sysfs = sysfs
+        self.retry_after = retry_after
+        self.files = None
+        self.name = None
+        self.next_probe = 0.0
+
+    def __call__(self):
+        if self.files is None:
+            if not self.sysfs or time.monotonic() < self.next_probe: return None
+            self.discover()
+            if not self.files:
+                self.files = None
+                self.next_probe = time.monotonic() + self.retry_after
+                return None
+        try: values = {name: value.read() / 1e6 for name, value in self.files.items()}
+        except (OSError, ValueError):
+            for value in self.files.values(): value.close()
+            self.files = self.name = None
+            return None
+        voltage, current, power = (values.get(name) for name in POWER_FILES)
+        if current is not None: current = abs(current)
+        if power is not None: power = abs(power)
+        if current is None and power is not None and voltage: current = power / voltage
+        if power is None and current is not None and voltage is not None: power = current * voltage
+        return PowerState(voltage, current, power)
+
+    def discover(self):
+        self.files = {}
+        supplies = os.path.join(self.sysfs, "class", "power_supply")
+        try: names = sorted(os.listdir(supplies))
+        except OSError: return
+        for name in names:
+            base = os.path.join(supplies, name)
+            try:
+                if read_sysfs_text(os.path.join(base, "type")) != "Battery": continue
+                # Peripheral batteries (mice, headsets) report scope "Device".
+                if os.path.exists(os.path.join(base, "scope")) and read_sysfs_text(os.path.join(base, "scope")) == "Device": continue
+            except OSError: continue
+            for attribute in POWER_FILES:
+                try: self.files[attribute] = SysfsValue(os.path.join(base, attribute))
+                except OSError: pass
+            if "voltage_now" in self.files or "power_now" in self.files:
+                self.name = name
+                return
+            for value in self.files.values(): value.close()
+            self.files = {}
+
+class CollectorEngine:
+    def __init__(self):
+        self.collectors = {}
+        self._active = threading.Event()
+        self._stopped = threading.Event()
+        self._changed = threading.Condition()
+        self.keep = frozenset()
+        self.instrumentation = None
+
+    def add(self, collector):
+        self.collectors[collector.name] = collector
+        return collector
+
+    def start(self, paused=False):
+        for collector in self.collectors.values():
+            threading.Thread(target=self._run, args=(collector,), name=f"collector-{collector.name}", daemon=True).start()
+        if not paused: self.resume()
+
+    def _run(self, collector):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._active.is_set() or collector.name in self.keep)
+            if self._stopped.is_set(): return
+            started = time.monotonic()
+            if collector.enabled:
+                collector.sample()
+                if self.instrumentation: self.instrumentation.record(f"collect.{collector.name}", time.monotonic() - started)
+            if collector.wake.wait(max(0.0, collector.interval - (time.monotonic() - started))):
+                collector.wake.clear()
+
+    def _wake_all(self):
+        with self._changed: self._changed.notify_all()
+        for collector in self.collectors.values(): collector.wake.set()
+
+    def pause(self, keep=()):
+        # Collectors named in `keep` go on sampling while the rest wait for resume().
+        self.keep = frozenset(keep)
+        self._active.clear()
+        self._wake_all()
+
+    def resume(self):
+        self._active.set()
+        with self._changed: self._changed.notify_all()
+
+    def stop(self):
+        self._stopped.set()
+        self._active.set()
+        self._wake_all()
+
+    def set_interval(self, interval):
+        for collector in self.collectors.values():
+            collector.interval = interval * collector.interval_scale
+
+    def configure(self, settings):
+        for collector in self.collectors.values():
+            keys = collector.setting if isinstance(collector.setting, tuple) else (collector.setting,)
+            enabled = collector.setting is None or any(settings.get(key, True) for key in keys)
+            if enabled and not collector.enabled: collector.wake.set()
+            collector.enabled = enabled
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {name: collector.read(now) for name, collector in self.collectors.items()}
+
+def load_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError: return None
+
+CoreStats = namedtuple("CoreStats", "percent freq_mhz max_mhz")
+NicStats = namedtuple("NicStats", "names rates")
+
+class PerCoreMeter:
+    # Per-core busy % from cpu_times deltas, so this does not share
+    # cpu_percent(percpu=True) state with the spike detector.
+    def __init__(self, provider=psutil):
+        self.psutil = provider
+        self.np = None
+        self.np_checked = False
+        self.last = None
+        self.total_weights = None
+        self.idle_weights = None
+
+    def _weights(self, fields):
+        total = [0.0 if name in ("guest", "guest_nice") else 1.0 for name in fields]
+        idle = [1.0 if name in ("idle", "iowait") else 0.0 for name in fields]
+        return total, idle
+
+    def __call__(self):
+        times = self.psutil.cpu_times(percpu=True)
+        try: freqs = self.psutil.cpu_freq(percpu=True) or []
+        except Exception: freqs = []
+        if self.total_weights is None: self.total_weights, self.idle_weights = self._weights(type(times[0])._fields)
+        if not self.np_checked: self.np, self.np_checked = load_numpy(), True
+        np = self.np
+        if np is not None:
+            current = np.array(times, dtype=float)
+            last, self.last = self.last, current
+            if last is None or last.shape != current.shape: return None
+            delta = current - last
+            total = delta @ np.array(self.total_weights)
+            idle = delta @ np.array(self.idle_weights)
+            percent = np.clip(np.divide(total - idle, total, out=np.zeros_like(total), where=total > 0) * 100, 0.0, 100.0)
+            freq = np.array([f.current for f in freqs], dtype=float)
+            max_freq = np.array([f.max for f in freqs], dtype=float)
+            return CoreStats(percent.tolist(), freq.tolist(), max_freq.tolist())
+        last, self.last = self.last, times
+        if last is None or len(last) != len(times): return None
+        percent = []
+        for now_times, last_times in zip(times, last):
+            delta = [a - b for a, b in zip(now_times, last_times)]
+            total = sum(d * w for d, w in zip(delta, self.total_weights))
+            idle = sum(d * w for d, w in zip(delta, self.idle_weights))
+            percent.append(min(max((total - idle) / total * 100, 0.0), 100.0) if total > 0 else 0.0)
+        return CoreStats(percent, [f.current for f in freqs], [f.max for f in freqs])
+
+class PerNicMeter:
+    def __init__(self, provider=psutil):
+        self.psutil = provider
+        self.np = None
+        self.np_checked = False
+        self.last = None
+
+    def __call__(self):
+        counters = self.psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        names = tuple(counters)
+        values = [(c.bytes_sent, c.bytes_recv) for c in counters.values()]
+        if not self.np_checked: self.np, self.np_checked = load_numpy(), True
+        np = self.np
+        current = np.array(values, dtype=float).reshape(-1, 2) if np is not None else values
+        last, self.last = self.last, (now, names, current)
+        if last is None or last[1] != names or now <= last[0]: return None
+        scale = 8 / (now - last[0])
+        if np is not None: rates = ((current - last[2]) * scale).tolist()
+        else: rates = [((s - ls) * scale, (r - lr) * scale) for (s, r), (ls, lr) in zip(current, last[2])]
+        return NicStats(names, rates)
+
+SelfStats = namedtuple("SelfStats", "cpu_percent rss threads thread_names")
+
+class SelfStatsMeter:
+    def __init__(self, instrumentation, settings, provider=psutil):
+        self.instrumentation = instrumentation
+        self.settings = settings
+        self.psutil = provider
+        self.process = None
+        self.logger = None
+        self.last_log = time.monotonic()
+
+    def __call__(self):
+        if self.process is None: self.process = self.psutil.Process(os.getpid())
+        with self.process.oneshot():
+            stats = SelfStats(self.process.cpu_percent(None), self.process.memory_info().rss, self.process.num_threads(),
+                              tuple(thread.name for thread in threading.enumerate()))
+        now = time.monotonic()
+        if self.settings.get("stats_log", False) and now - self.last_log >= self.settings.get("stats_log_interval", 10.0):
+            self.last_log = now
+            self.write_log(stats)
+        return stats
+
+    def write_log(self, stats):
+        if self.logger is None:
+            import logging
+            from logging.handlers import RotatingFileHandler
+            os.makedirs(APP_DATA_PATH, exist_ok=True)
+            self.logger = logging.getLogger("EvlonClient.stats")
+            self.logger.propagate = False
+            handler = RotatingFileHandler(STATS_FILE, maxBytes=512 * 1024, backupCount=2, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+        self.logger.info(json.dumps({
+            "time": datetime.now().isoformat(timespec='seconds'),
+            "cpu_percent": stats.cpu_percent, "cpu_budget_percent": self.settings.get("cpu_budget_percent", 1.0),
+            "rss": stats.rss, "threads": stats.threads, "thread_names": stats.thread_names,
+            "update_interval": self.settings.get("update_interval", 2.0),
+            "histograms": self.instrumentation.summary(),
+        }))
+
+def create_collector_engine(provider=psutil):
+    engine = CollectorEngine()
+    # sysfs fast paths only apply to the real psutil on Linux; injected providers always go through the provider.
+    sysfs = SYSFS_ROOT if provider is psutil and sys.platform.startswith("linux") else None
+    engine.add(MetricCollector("cpu", lambda: provider.cpu_percent(), "show_cpu"))
+    engine.add(MetricCollector("ram", lambda: provider.virtual_memory().percent, "show_ram"))
+    engine.add(MetricCollector("temp", TemperatureSensor(provider, sysfs), ("show_temp", "show_throttle"), interval_scale=2.0, timeout=3.0))
+    engine.add(MetricCollector("freq", CpuFreqMeter(provider, sysfs), "show_throttle"))
+    engine.add(MetricCollector("power", BatteryPowerMeter(sysfs), ("show_voltage", "show_amperage"), interval_scale=2.5, timeout=5.0))
+    engine.add(MetricCollector("net", NetRateMeter(provider), "show_network"))
+    engine.add(MetricCollector("percpu", PerCoreMeter(provider), "show_details"))
+    engine.add(MetricCollector("pernic", PerNicMeter(provider), "show_details"))
+    # Always sampled: the refresh interval depends on whether we are on battery power.
+    engine.add(MetricCollector("battery", lambda: provider.sensors_battery(), interval_scale=5.0, timeout=5.0))
+    return engine
+
+class RefreshScheduler:
+    def __init__(self, root, callback, interval=2.0):
+        self.root = root
+        self.callback = callback
+        self.interval = interval
+        self.instrumentation = None
+        self._after_id = None
+        self._next_time = 0.0
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def start(self, delay=0.0):
+        if self.running: return
+        self._next_time = time.monotonic() + delay
+        self._after_id = self.root.after(int(delay * 1000), self._tick)
+
+    def stop(self):
+        if self._after_id is None: return
+        self.root.after_cancel(self._after_id)
+        self._after_id = None
+
+    def _tick(self):
+        started = time.monotonic()
+        if self.instrumentation: self.instrumentation.record("tick.jitter", abs(started - self._next_time))
+        self.callback()
+        if self._after_id is None: return
+        now = time.monotonic()
+        if self.instrumentation: self.instrumentation.record("tick.total", now - started)
+        # Schedule against the planned time rather than "now" so ticks do not drift.
+        self._next_time += self.interval
+        if self._next_time <= now: self._next_time = now + self.interval
+        self._after_id = self.root.after(int((self._next_time - now) * 1000), self._tick)
+
+HISTORY_SIZE = 300
+HISTORY_METRICS = ("cpu", "ram", "temp", "net_up", "net_down", "battery")
+
+class MetricRing:
+    def __init__(self, size):
+        self.size = size
+        self.data = array('d', [math.nan]) * size
+        self.index = 0
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.index] = math.nan if value is None else value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size: self.count += 1
+
+    def latest(self):
+        return self.data[self.index - 1] if self.count else math.nan
+
+    def values(self, n=None):
+        n = self.count if n is None else min(n, self.count)
+        start = (self.index - n) % self.size
+        if start + n <= self.size: return self.data[start:start + n]
+        return self.data[start:] + self.data[:self.index]
+
+class MetricHistory:
+    def __init__(self, size=HISTORY_SIZE):
+        self.rings = {name: MetricRing(size) for name in HISTORY_METRICS}
+
+    def push(self, snapshot):
+        rings = self.rings
+        net = snapshot.get("net")
+        battery = snapshot.get("battery")
+        rings["cpu"].append(snapshot.get("cpu"))
+        rings["ram"].append(snapshot.get("ram"))
+        rings["temp"].append(snapshot.get("temp"))
+        rings["net_up"].append(net[0] if net else None)
+        rings["net_down"].append(net[1] if net else None)
+        rings["battery"].append(battery.percent if battery else None)
+
+GRAPH_METRICS = (
+    ("cpu", "CPU", "show_cpu", 100.0),
+    ("ram", "RAM", "show_ram", 100.0),
+    ("temp", "TEMP", "show_temp", 100.0),
+    ("net_up", "UP", "show_network", None),
+    ("net_down", "DOWN", "show_network", None),
+    ("battery", "BAT", "show_battery", 100.0),
+)
+
+class Sparkline:
+    def __init__(self, parent, ring, label, points, max_value=None, width=120, height=24, bg="#222222", fg="white"):
+        self.ring = ring
+        self.points = max(2, min(points, ring.size))
+        self.fixed_max = max_value
+        self.max_value = max_value or 8 * 1024.0
+        self.peak_age = 0
+        self.width = width
+        self.height = height
+        self.step = width / (self.points - 1)
+        self.fg = fg
+        self.last_y = None
+        self.segments = deque()
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg=bg, highlightthickness=0, bd=0)
+        self.canvas.create_text(2, 1, text=label, anchor="nw", fill=fg, font=("Arial", 7))
+        self.redraw()
+
+    def _y(self, value):
+        return self.height - 1 - min(value / self.max_value, 1.0) * (self.height - 2)
+
+    def push(self):
+        value = self.ring.latest()
+        if self.fixed_max is None:
+            self.peak_age += 1
+            # Rescaling needs a full redraw, so only do it when the scale is clearly wrong.
+            if value > self.max_value or self.peak_age >= self.points: return self.redraw()
+        self.canvas.move("seg", -self.step, 0)
+        if len(self.segments) >= self.points - 1:
+            oldest = self.segments.popleft()
+            if oldest: self.canvas.delete(oldest)
+        y = None if math.isnan(value) else self._y(value)
+        segment = None
+        if y is not None and self.last_y is not None:
+            segment = self.canvas.create_line(self.width - self.step, self.last_y, self.width, y, fill=self.fg, tags="seg")
+        self.segments.append(segment)
+        self.last_y = y
+
+    def redraw(self):
+        self.canvas.delete("seg")
+        self.segments.clear()
+        values = self.ring.values(self.points)
+        if self.fixed_max is None:
+            peak = max((v for v in values if not math.isnan(v)), default=0.0)
+            self.max_value = max(peak * 1.25, 8 * 1024.0)
+            self.peak_age = 0
+        self.last_y = None
+        x = self.width - (len(values) - 1) * self.step
+        for i, value in enumerate(values):
+            y = None if math.isnan(value) else self._y(value)
+            if i:
+                segment = None
+                if y is not None and self.last_y is not None:
+                    segment = self.canvas.create_line(x - self.step, self.last_y, x, y, fill=self.fg, tags="seg")
+                self.segments.append(segment)
+            self.last_y = y
+            x += self.step
+
+SpikeEvent = namedtuple("SpikeEvent", "time reason samples top_processes")
+
+class SpikeDetector:
+    def __init__(self, settings, provider=psutil):
+        self.psutil = provider
+        self.events = deque(maxlen=20)
+        self.last_event = None
+        self._stop = None
+        self.configure(settings)
+
+    def configure(self, settings):
+        self.sample_interval = min(max(settings.get("spike_sample_ms", 75), 50), 100) / 1000
+        self.cpu_threshold = settings.get("spike_cpu_threshold", 90.0)
+        self.disk_threshold = settings.get("spike_disk_mb_s", 150.0) * 1024 * 1024
+        self.pre_samples = int(settings.get("spike_pre_seconds", 1.0) / self.sample_interval) + 1
+        self.post_samples = max(1, int(settings.get("spike_post_seconds", 0.5) / self.sample_interval))
+        self.cpu_budget = settings.get("spike_cpu_budget", 2.0) / 100
+        self.cooldown = 5.0
+
+    @property
+    def running(self):
+        return self._stop is not None and not self._stop.is_set()
+
+    def start(self):
+        if self.running: return
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(self._stop,), name="spike-detector", daemon=True).start()
+
+    def stop(self):
+        if self._stop: self._stop.set()
+
+    def _run(self, stop):
+        samples = deque(maxlen=self.pre_samples + self.post_samples)
+        self.psutil.cpu_percent(percpu=True)
+        last_disk, last_ctx, last_time = self._read_io(), self.psutil.cpu_stats().ctx_switches, time.monotonic()
+        interval = self.sample_interval
+        reason, post_left, cooldown_until = None, 0, 0.0
+        budget_cpu, budget_wall = time.thread_time(), last_time
+        next_time = last_time
+        while True:
+            next_time += interval
+            if stop.wait(max(0.0, next_time - time.monotonic())): return
+            now = time.monotonic()
+            cores = self.psutil.cpu_percent(percpu=True)
+            disk, ctx = self._read_io(), self.psutil.cpu_stats().ctx_switches
+            elapsed = max(now - last_time, 1e-6)
+            disk_rate = (disk - last_disk) / elapsed
+            ctx_rate = (ctx - last_ctx) / elapsed
+            last_disk, last_ctx, last_time = disk, ctx, now
+            cpu = sum(cores) / len(cores) if cores else 0.0
+            samples.append((time.time(), cpu, cores, disk_rate, ctx_rate))
+            if reason is None:
+                if now >= cooldown_until:
+                    # A single pegged core (one busy game or driver thread) is what causes hitches, not the average.
+                    busiest = max(range(len(cores)), key=cores.__getitem__) if cores else None
+                    if busiest is not None and cores[busiest] >= self.cpu_threshold: reason = f"CPU core {busiest} {cores[busiest]:.0f}%"
+                    elif disk_rate >= self.disk_threshold: reason = f"DISK {disk_rate / (1024 * 1024):.0f} MB/s"
+                    if reason:
+                        post_left = self.post_samples
+                        self._prime_processes()
+            else:
+                post_left -= 1
+                if post_left <= 0:
+                    event = SpikeEvent(time.time(), reason, list(samples), self._top_processes())
+                    self.events.append(event)
+                    self.last_event = event
+                    reason, cooldown_until = None, now + self.cooldown
+            # Stay inside the CPU budget by stretching the sampling interval when we exceed it.
+            if now - budget_wall >= 2.0:
+                used = (time.thread_time() - budget_cpu) / (now - budget_wall)
+                if used > self.cpu_budget: interval = min(interval * 1.5, 0.5)
+                elif used < self.cpu_budget / 2: interval = max(interval / 1.5, self.sample_interval)
+                budget_cpu, budget_wall = time.thread_time(), now
+
+    def _read_io(self):
+        disk = self.psutil.disk_io_counters()
+        return disk.read_bytes + disk.write_bytes if disk else 0
+
+    def _prime_processes(self):
+        # process_iter caches Process objects, so this sets the baseline for cpu_percent below.
+        for proc in self.psutil.process_iter():
+            try: proc.cpu_percent(None)
+            except (self.psutil.NoSuchProcess, self.psutil.AccessDenied): pass
+
+    def _top_processes(self, limit=5):
+        top = []
+        for proc in self.psutil.process_iter():
+            if proc.pid == 0: continue
+            try:
+                with proc.oneshot():
+                    top.append((proc.cpu_percent(None), proc.name(), proc.pid, proc.memory_info().rss))
+            except (self.psutil.NoSuchProcess, self.psutil.AccessDenied): pass
+        top.sort(reverse=True)
+        return top[:limit]
+
+FILE_ATTRIBUTE_REPARSE_POINT = 0x400
+
+def temp_folders():
+    system_root = os.environ.get('SystemRoot')
+    folders = [os.environ.get('TEMP')]
+    if system_root:
+        folders += [os.path.join(system_root, 'Temp'), os.path.join(system_root, 'Prefetch'), os.path.join(system_root, 'SoftwareDistribution', 'Download')]
+    return folders
+
+class TempCleaner:
+    def __init__(self, folders, progress=None, max_workers=4):
+        self.folders = [folder for folder in dict.fromkeys(folders) if folder and os.path.isdir(folder)]
+        self.progress = progress
+        self.max_workers = max(1, min(max_workers, len(self.folders)))
+        self.cancelled = threading.Event()
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.done_count = 0
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def scan(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = dict(zip(self.folders, pool.map(self._scan_tree, self.folders)))
+        self.total_bytes = sum(size for _, size in results.values())
+        return results
+
+    def clean(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = dict(zip(self.folders, pool.map(self._clean_root, self.folders)))
+        self._report(force=True)
+        return results
+
+    def _is_link(self, entry, stat):
+        return entry.is_symlink() or getattr(stat, 'st_file_attributes', 0) & FILE_ATTRIBUTE_REPARSE_POINT
+
+    def _scan_tree(self, path):
+        count, size = 0, 0
+        stack = [path]
+        while stack and not self.cancelled.is_set():
+            try: entries = os.scandir(stack.pop())
+            except OSError: continue
+            with entries:
+                for entry in entries:
+                    try:
+                        # DirEntry.stat() is served from the directory listing on Windows.
+                        stat = entry.stat(follow_symlinks=False)
+                        if entry.is_dir(follow_symlinks=False) and not self._is_link(entry, stat): stack.append(entry.path)
+                        else:
+                            count += 1
+                            size += stat.st_size
+                    except OSError: continue
+        return count, size
+
+    def _clean_root(self, root):
+        return self._remove_contents(root)
+
+    def _remove_contents(self, path):
+        count, size = 0, 0
+        try: entries = os.scandir(path)
+        except OSError: return count, size
+        with entries:
+            for entry in entries:
+                if self.cancelled.is_set(): break
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if entry.is_dir(follow_symlinks=False) and not self._is_link(entry, stat):
+                        sub_count, sub_size = self._remove_contents(entry.path)
+                        count += sub_count
+                        size += sub_size
+                        os.rmdir(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        # Junctions are removed as links, never followed.
+                        os.rmdir(entry.path)
+                    else:
+                        os.unlink(entry.path)
+                        count += 1
+                        size += stat.st_size
+                        self._advance(1, stat.st_size)
+                except OSError: continue
+        return count, size
+
+    def _advance(self, count, size):
+        with self._lock:
+            self.done_count += count
+            self.done_bytes += size
+        self._report()
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        if not self.progress or (not force and now - self._last_report < 0.1): return
+        self._last_report = now
+        self.progress(self.done_count, self.done_bytes, self.total_bytes)
+
+SESSION_HEADER = struct.Struct("<8sI4x")
+SESSION_MAGIC = b"EVLREC01"
+# time, cpu, ram, temp, net up, net down, battery, flags
+RECORD_STRUCT = struct.Struct("<dffffffB3x")
+RECORD_FIELDS = ("time", "cpu", "ram", "temp", "net_up_bps", "net_down_bps", "battery", "flags")
+FLAG_BATTERY, FLAG_PLUGGED, FLAG_SPIKE = 1, 2, 4
+
+BatteryState = namedtuple("BatteryState", "percent power_plugged")
+
+def pack_record(buffer, offset, timestamp, snapshot, spike=False):
+    net = snapshot.get("net")
+    battery = snapshot.get("battery")
+    flags = (FLAG_BATTERY if battery else 0) | (FLAG_PLUGGED if battery and battery.power_plugged else 0) | (FLAG_SPIKE if spike else 0)
+    nan = math.nan
+    cpu, ram, temp = snapshot.get("cpu"), snapshot.get("ram"), snapshot.get("temp")
+    RECORD_STRUCT.pack_into(buffer, offset, timestamp,
+                            nan if cpu is None else cpu, nan if ram is None else ram, nan if temp is None else temp,
+                            net[0] if net else nan, net[1] if net else nan,
+                            battery.percent if battery else nan, flags)
+
+def record_to_snapshot(record):
+    timestamp, cpu, ram, temp, net_up, net_down, battery, flags = record
+    value = lambda v: None if math.isnan(v) else v
+    return {
+        "cpu": value(cpu), "ram": value(ram), "temp": value(temp),
+        "net": None if math.isnan(net_up) else (net_up, net_down),
+        "battery": BatteryState(battery, bool(flags & FLAG_PLUGGED)) if flags & FLAG_BATTERY else None,
+        "replay_time": timestamp,
+    }
+
+class SessionRecorder:
+    def __init__(self, directory=SESSIONS_PATH, batch_size=30, max_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.batch_size = max(1, batch_size)
+        self.max_bytes = max_bytes
+        self.buffer = bytearray(RECORD_STRUCT.size * self.batch_size)
+        self.pending = 0
+        self.path = None
+        self._file = None
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, snapshot, spike=False):
+        pack_record(self.buffer, self.pending * RECORD_STRUCT.size, time.time(), snapshot, spike)
+        self.pending += 1
+        if self.pending >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self.pending: return
+        self._queue.put(bytes(self.buffer[:self.pending * RECORD_STRUCT.size]))
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+
+    def wait(self):
+        self._queue.join()
+
+    def _open_new_file(self):
+        if self._file: self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, datetime.now().strftime("session_%Y%m%d_%H%M%S"))
+        self.path, suffix = base + ".evr", 0
+        while os.path.exists(self.path):
+            suffix += 1
+            self.path = f"{base}_{suffix}.evr"
+        self._file = open(self.path, 'wb')
+        self._file.write(SESSION_HEADER.pack(SESSION_MAGIC, RECORD_STRUCT.size))
+
+    def _write_loop(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    if self._file: self._file.close()
+                    self._file = None
+                    return
+                if self._file is None or self._file.tell() + len(batch) > self.max_bytes: self._open_new_file()
+                self._file.write(batch)
+                self._file.flush()
+            except OSError as e: print(f"Recorder error: {e}")
+            finally: self._queue.task_done()
+
+class SessionReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.map = b""
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size: self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if size < SESSION_HEADER.size: raise ValueError(f"Not a session log: {path}")
+            magic, record_size = SESSION_HEADER.unpack_from(self.map, 0)
+            if magic != SESSION_MAGIC or record_size != RECORD_STRUCT.size: raise ValueError(f"Not a session log: {path}")
+        except BaseException:
+            # Windows keeps the file locked while a handle or mapping is open.
+            self.close()
+            raise
+        self.count = (size - SESSION_HEADER.size) // RECORD_STRUCT.size
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap): self.map.close()
+        self._file.close()
+
+    def record(self, index):
+        return RECORD_STRUCT.unpack_from(self.map, SESSION_HEADER.size + index * RECORD_STRUCT.size)
+
+    def time_at(self, index):
+        return struct.unpack_from("<d", self.map, SESSION_HEADER.size + index * RECORD_STRUCT.size)[0]
+
+    def bisect(self, timestamp):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.time_at(mid) < timestamp: low = mid + 1
+            else: high = mid
+        return low
+
+    def range(self, start=None, end=None):
+        first = 0 if start is None else self.bisect(start)
+        last = self.count if end is None else self.bisect(end)
+        for index in range(first, last): yield self.record(index)
+
+    def export_csv(self, path, start=None, end=None):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(("iso_time",) + RECORD_FIELDS)
+            for record in self.range(start, end):
+                writer.writerow((datetime.fromtimestamp(record[0]).isoformat(timespec='milliseconds'),) + tuple("" if isinstance(v, float) and math.isnan(v) else v for v in record))
+
+class SessionReplay:
+    def __init__(self, reader):
+        self.reader = reader
+        self.index = 0
+
+    def next_snapshot(self):
+        if self.index >= len(self.reader): return None
+        record = self.reader.record(self.index)
+        self.index += 1
+        return record_to_snapshot(record)
+
+def to_jsonable(value):
+    if isinstance(value, float): return None if math.isnan(value) else value
+    if hasattr(value, "_asdict"): return {key: to_jsonable(item) for key, item in value._asdict().items()}
+    if isinstance(value, dict): return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, array)): return [to_jsonable(item) for item in value]
+    return value
+
+PROMETHEUS_GAUGES = (
+    ("evlon_cpu_percent", "CPU usage percent", lambda s: s.get("cpu")),
+    ("evlon_ram_percent", "RAM usage percent", lambda s: s.get("ram")),
+    ("evlon_cpu_temperature_celsius", "CPU temperature", lambda s: s.get("temp")),
+    ("evlon_net_sent_bits_per_second", "Network upload rate", lambda s: s["net"][0] if s.get("net") else None),
+    ("evlon_net_recv_bits_per_second", "Network download rate", lambda s: s["net"][1] if s.get("net") else None),
+    ("evlon_battery_percent", "Battery charge percent", lambda s: s["battery"].percent if s.get("battery") else None),
+    ("evlon_battery_power_plugged", "1 when on AC power", lambda s: int(bool(s["battery"].power_plugged)) if s.get("battery") else None),
+)
+
+def format_prometheus(timestamp, snapshot):
+    lines = []
+    for name, help_text, read in PROMETHEUS_GAUGES:
+        value = read(snapshot)
+        if value is None: continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    cores = snapshot.get("percpu")
+    if cores:
+        lines += ["# HELP evlon_core_percent Per-core CPU usage percent", "# TYPE evlon_core_percent gauge"]
+        lines += [f'evlon_core_percent{{core="{index}"}} {value}' for index, value in enumerate(cores.percent)]
+    nics = snapshot.get("pernic")
+    if nics:
+        lines += ["# HELP evlon_nic_bits_per_second Per-interface network rate", "# TYPE evlon_nic_bits_per_second gauge"]
+        for name, (sent, recv) in zip(nics.names, nics.rates):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines += [f'evlon_nic_bits_per_second{{nic="{label}",direction="sent"}} {sent}', f'evlon_nic_bits_per_second{{nic="{label}",direction="recv"}} {recv}']
+    if timestamp:
+        lines += ["# HELP evlon_snapshot_age_seconds Seconds since the overlay last sampled", "# TYPE evlon_snapshot_age_seconds gauge",
+                  f"evlon_snapshot_age_seconds {time.time() - timestamp:.3f}"]
+    return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    # Serves whatever the overlay last sampled; reading never triggers sampling.
+    def __init__(self, source, history, port, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import urlparse, parse_qs
+        exporter = self
+        self.source = source
+        self.history = history
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                timestamp, snapshot = exporter.source()
+                if url.path == "/metrics":
+                    body, content_type = format_prometheus(timestamp, snapshot or {}), "text/plain; version=0.0.4"
+                elif url.path in ("/", "/json"):
+                    try: points = int(parse_qs(url.query).get("history", ["60"])[0])
+                    except ValueError: points = 60
+                    body = json.dumps({"time": timestamp, "snapshot": to_jsonable(snapshot or {}),
+                                       "history": {name: to_jsonable(ring.values(max(0, points))) for name, ring in exporter.history.rings.items()}})
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def stop(self):
+        server = self.server
+        def shutdown():
+            server.shutdown()
+            server.server_close()
+        threading.Thread(target=shutdown, daemon=True).start()
+
+# Shared memory layout: header (magic, version, record size, sequence) followed by one RECORD_STRUCT.
+# The sequence is odd while a write is in progress; readers retry until they see the same even value twice.
+SHARED_MEMORY_NAME = "EvlonClientMetrics"
+SHARED_HEADER = struct.Struct("<4sHHI")
+SHARED_MAGIC = b"EVLM"
+SHARED_SEQ_OFFSET = 8
+
+class SharedMetricsBlock:
+    # The block is owned by the instance that created it; a second instance fails instead of sharing (and later
+    # unlinking) another process's block.
+    def __init__(self, name=SHARED_MEMORY_NAME):
+        from multiprocessing import shared_memory
+        size = SHARED_HEADER.size + RECORD_STRUCT.size
+        try: self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError: raise FileExistsError(f"Shared memory block {name} is already published by another instance")
+        self.seq = 0
+        SHARED_HEADER.pack_into(self.shm.buf, 0, SHARED_MAGIC, 1, RECORD_STRUCT.size, self.seq)
+
+    def publish(self, snapshot, spike=False):
+        buf = self.shm.buf
+        self.seq += 1
+        struct.pack_into("<I", buf, SHARED_SEQ_OFFSET, self.seq)
+        pack_record(buf, SHARED_HEADER.size, time.time(), snapshot, spike)
+        self.seq += 1
+        struct.pack_into("<I", buf, SHARED_SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self.shm.close()
+        try: self.shm.unlink()
+        except FileNotFoundError: pass
+
+def attach_shared_memory(name):
+    # Attaching must not register the block with this process's resource tracker: on POSIX before 3.13 the
+    # tracker would unlink the overlay's block when the reader exits.
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13): return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name != 'nt':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def read_shared_metrics(name=SHARED_MEMORY_NAME, retries=100):
+    shm = attach_shared_memory(name)
+    try:
+        magic, version, record_size, _ = SHARED_HEADER.unpack_from(shm.buf, 0)
+        if magic != SHARED_MAGIC or record_size != RECORD_STRUCT.size: raise ValueError(f"Unexpected shared memory layout in {name}")
+        for _ in range(retries):
+            before = struct.unpack_from("<I", shm.buf, SHARED_SEQ_OFFSET)[0]
+            if before & 1: continue
+            record = RECORD_STRUCT.unpack_from(shm.buf, SHARED_HEADER.size)
+            if struct.unpack_from("<I", shm.buf, SHARED_SEQ_OFFSET)[0] == before:
+                # A live sample, not a replay: expose the publish time as plain "time".
+                snapshot = record_to_snapshot(record)
+                snapshot["time"] = snapshot.pop("replay_time")
+                return snapshot
+        return None
+    finally: shm.close()
+
+# name: (Windows priority class, POSIX nice value)
+PRIORITY_LEVELS = {
+    "idle": ("IDLE_PRIORITY_CLASS", 19),
+    "below_normal": ("BELOW_NORMAL_PRIORITY_CLASS", 10),
+    "normal": ("NORMAL_PRIORITY_CLASS", 0),
+    "above_normal": ("ABOVE_NORMAL_PRIORITY_CLASS", -5),
+    "high": ("HIGH_PRIORITY_CLASS", -10),
+}
+PriorityRule = namedtuple("PriorityRule", "role pattern priority cpus")
+
+def parse_cpu_list(text):
+    cpus = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def parse_priority_rule(line):
+    # "game <pattern> <priority> [cpus]" or "bg <pattern> <priority> [cpus]", e.g. "game valorant*.exe high 0-7"
+    parts = line.split()
+    if len(parts) not in (3, 4) or parts[0] not in ("game", "bg"):
+        raise ValueError(f"Expected 'game|bg <pattern> <priority> [cpus]': {line}")
+    if parts[2] not in PRIORITY_LEVELS:
+        raise ValueError(f"Unknown priority '{parts[2]}' (use {', '.join(PRIORITY_LEVELS)}): {line}")
+    try: cpus = parse_cpu_list(parts[3]) if len(parts) == 4 else None
+    except ValueError: raise ValueError(f"Invalid CPU list '{parts[3]}': {line}")
+    return PriorityRule(parts[0], parts[1].lower(), parts[2], cpus)
+
+class PriorityManager:
+    def __init__(self, rules, provider=psutil, interval=3.0):
+        self.rules = rules
+        self.psutil = provider
+        self.interval = interval
+        self.known = {}
+        self.games = {}
+        self.hogs = {}
+        self.applied = {}
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._stop is not None and not self._stop.is_set()
+
+    def start(self):
+        if self.running: return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="priority-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        # Waits for the thread's revert_all, so a replacement manager never records boosted values as "original".
+        if self._stop: self._stop.set()
+        if self._thread and self._thread is not threading.current_thread(): self._thread.join(timeout)
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try: self.scan()
+            except Exception as e: print(f"Priority manager error: {e}")
+            stop.wait(self.interval)
+        self.revert_all()
+
+    def match(self, name):
+        name = name.lower()
+        for rule in self.rules:
+            if fnmatch.fnmatch(name, rule.pattern): return rule
+        return None
+
+    def scan(self):
+        # Only PIDs we have not seen before get a name lookup; only the ones we act on are checked for PID reuse.
+        if not self.known:
+            processes = [(proc.pid, proc, proc.info["name"]) for proc in self.psutil.process_iter(attrs=["name"])]
+        else:
+            pids = set(self.psutil.pids())
+            # is_running() compares create_time, so a recycled PID counts as a new process.
+            tracked = (self.games.keys() | self.hogs.keys() | self.applied.keys()) & pids
+            reused = {pid for pid in tracked if not self._alive(self.known[pid][0])}
+            for pid in (self.known.keys() - pids) | reused: self._forget(pid)
+            processes = []
+            for pid in pids - self.known.keys():
+                try:
+                    proc = self.psutil.Process(pid)
+                    processes.append((pid, proc, proc.name()))
+                except (self.psutil.NoSuchProcess, self.psutil.AccessDenied): self.known[pid] = (None, None)
+        had_games = bool(self.games)
+        for pid, proc, name in processes:
+            rule = self.match(name or "")
+            self.known[pid] = (proc, rule)
+            if rule is None: continue
+            if rule.role == "game":
+                self.games[pid] = proc
+                self._apply(pid, proc, rule)
+            else:
+                self.hogs[pid] = (proc, rule)
+                if self.games: self._apply(pid, proc, rule)
+        if self.games and not had_games:
+            for pid, (proc, rule) in self.hogs.items(): self._apply(pid, proc, rule)
+        elif had_games and not self.games:
+            for pid in list(self.hogs): self._revert(pid)
+
+    def _alive(self, proc):
+        try: return proc.is_running()
+        except Exception: return False
+
+    def _forget(self, pid):
+        self.known.pop(pid, None)
+        self.applied.pop(pid, None)
+        self.hogs.pop(pid, None)
+        if self.games.pop(pid, None) is not None and not self.games:
+            for hog in list(self.hogs): self._revert(hog)
+
+    def _priority_value(self, priority):
+        class_name, nice = PRIORITY_LEVELS[priority]
+        return getattr(self.psutil, class_name) if os.name == 'nt' else nice
+
+    def _apply(self, pid, proc, rule):
+        if pid in self.applied: return
+        try:
+            original_affinity = proc.cpu_affinity() if rule.cpus and hasattr(proc, "cpu_affinity") else None
+            original_nice = proc.nice()
+            proc.nice(self._priority_value(rule.priority))
+            if original_affinity is not None: proc.cpu_affinity(rule.cpus)
+            self.applied[pid] = (proc, original_nice, original_affinity)
+        except (self.psutil.NoSuchProcess, self.psutil.AccessDenied, ValueError) as e:
+            print(f"Priority error ({pid}): {e}")
+
+    def _revert(self, pid):
+        entry = self.applied.pop(pid, None)
+        if entry is None: return
+        proc, original_nice, original_affinity = entry
+        try:
+            if not proc.is_running(): return
+            proc.nice(original_nice)
+            if original_affinity is not None: proc.cpu_affinity(original_affinity)
+        except (self.psutil.NoSuchProcess, self.psutil.AccessDenied, ValueError): pass
+
+    def revert_all(self):
+        for pid in list(self.applied): self._revert(pid)
+
+    def status(self):
+        # Runs on the Tk thread while scan() mutates these dicts, so iterate over copies.
+        applied = set(self.applied)
+        boosted = sum(1 for pid in list(self.games) if pid in applied)
+        lowered = sum(1 for pid in list(self.hogs) if pid in applied)
+        return f"{boosted} game(s) boosted, {lowered} background process(es) lowered"
+
+# Multi-host frames (one UDP datagram each): HOST_HEADER, the host name, then `count` samples.
+# A sample is a varint time offset in ms, a presence byte (bit per HOST_FIELDS entry, HOST_PLUGGED for AC power),
+# a changed byte and zigzag varint deltas of the quantized fields that changed since the previous sample.
+# Keyframes delta against zero so a viewer can join late or resync after a lost datagram.
+HOST_MAGIC = b"EVLH"
+HOST_HEADER = struct.Struct("<4sBBBBIdH")  # magic, version, flags, count, name length, seq, base time, interval ms
+HOST_PORT = 9466
+HOST_KEYFRAME = 1
+HOST_PLUGGED = 0x40
+HOST_FIELDS = (("cpu", 10), ("ram", 10), ("temp", 10), ("net_up", 0.01), ("net_down", 0.01), ("battery", 10))
+
+def host_values(snapshot):
+    net = snapshot.get("net")
+    battery = snapshot.get("battery")
+    values = (snapshot.get("cpu"), snapshot.get("ram"), snapshot.get("temp"),
+              net[0] if net else None, net[1] if net else None, battery.percent if battery else None)
+    return values, bool(battery and battery.power_plugged)
+
+def write_varint(out, value):
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80: return (value >> 1) ^ -(value & 1), offset
+
+class HostFrameEncoder:
+    def __init__(self, name, interval, keyframe_every=10):
+        self.name = name.encode("utf-8")[:255]
+        self.interval_ms = min(65535, int(interval * 1000))
+        self.keyframe_every = max(1, keyframe_every)
+        self.seq = 0
+        self.state = [0] * len(HOST_FIELDS)
+
+    def encode(self, samples):
+        keyframe = self.seq % self.keyframe_every == 0
+        if keyframe: self.state = [0] * len(HOST_FIELDS)
+        base = samples[0][0]
+        out = bytearray(HOST_HEADER.pack(HOST_MAGIC, 1, HOST_KEYFRAME if keyframe else 0, len(samples), len(self.name), self.seq, base, self.interval_ms))
+        out += self.name
+        state = self.state
+        for timestamp, snapshot in samples:
+            values, plugged = host_values(snapshot)
+            present = HOST_PLUGGED if plugged else 0
+            changed = 0
+            deltas = []
+            for index, value in enumerate(values):
+                if value is None: continue
+                present |= 1 << index
+                quantized = round(value * HOST_FIELDS[index][1])
+                if quantized != state[index]:
+                    changed |= 1 << index
+                    deltas.append(quantized - state[index])
+                    state[index] = quantized
+            write_varint(out, round((timestamp - base) * 1000))
+            out.append(present)
+            out.append(changed)
+            for delta in deltas: write_varint(out, delta)
+        self.seq = (self.seq + 1) & 0xffffffff
+        return bytes(out)
+
+class RemoteHost:
+    def __init__(self, name):
+        self.name = name
+        self.address = None
+        self.seq = None
+        self.state = [0] * len(HOST_FIELDS)
+        self.latest = (None, None)
+        self.last_seen = 0.0
+        self.period = 1.0
+        self.frames = 0
+        self.bytes = 0
+        self.resyncs = 0
+
+def parse_host_target(target, default_port=HOST_PORT):
+    host, _, port = target.rpartition(":") if ":" in target else (target, "", "")
+    return host or "127.0.0.1", int(port) if port else default_port
+
+class HostAgent:
+    # Headless sender: reads the engine's latest samples and pushes one frame per `batch` samples.
+    def __init__(self, engine, target, name=None, interval=0.5, batch=2, keyframe_every=10):
+        import socket
+        host, port = parse_host_target(target)
+        self.address = (socket.gethostbyname(host), port)
+        self.name = name or socket.gethostname()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.engine = engine
+        self.interval = interval
+        self.batch = max(1, batch)
+        self.encoder = HostFrameEncoder(self.name, interval, keyframe_every)
+        self.pending = []
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+    def run(self, stop):
+        next_tick = time.monotonic()
+        try:
+            while not stop.is_set():
+                self.pending.append((time.time(), self.engine.snapshot()))
+                if len(self.pending) >= self.batch: self.flush()
+                next_tick += self.interval
+                delay = next_tick - time.monotonic()
+                if delay < 0: next_tick, delay = time.monotonic(), 0
+                stop.wait(delay)
+        finally: self.sock.close()
+
+    def flush(self):
+        frame = self.encoder.encode(self.pending)
+        self.pending = []
+        try:
+            self.sock.sendto(frame, self.address)
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+        except OSError as e: print(f"Agent send error: {e}")
+
+class HostViewer:
+    # Receives agent frames and keeps the newest decoded snapshot per host; hosts are keyed by their reported name.
+    # At most max_hosts are tracked and hosts silent for forget_after seconds are dropped, so stray senders cannot grow the overlay.
+    def __init__(self, port=HOST_PORT, host="0.0.0.0", stale_periods=3.0, max_hosts=16, forget_after=300.0):
+        import socket
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+        self.stale_periods = stale_periods
+        self.max_hosts = max_hosts
+        self.forget_after = forget_after
+        self.hosts = {}
+        self.rejected = 0
+        self._next_forget = 0.0
+        self._next_error = 0.0
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="host-viewer", daemon=True).start()
+
+    @property
+    def port(self):
+        return self.sock.getsockname()[1]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try: data, address = self.sock.recvfrom(65535)
+            except OSError:
+                if self._stop.is_set(): break
+                data = None
+            now = time.monotonic()
+            if now >= self._next_forget: self.forget(now)
+            if data is None: continue
+            try: self.receive(data, address, now)
+            except (struct.error, IndexError, ValueError) as e:
+                # One line per 10 s at most; the rest are only counted.
+                self.rejected += 1
+                if now >= self._next_error:
+                    self._next_error = now + 10.0
+                    print(f"Bad host frame from {address[0]}: {e} ({self.rejected} rejected so far)")
+
+    def forget(self, now):
+        self._next_forget = now + 1.0
+        for name, host in list(self.hosts.items()):
+            if now - host.last_seen > self.forget_after: del self.hosts[name]
+
+    def receive(self, data, address, now):
+        magic, version, flags, count, name_length, seq, base, interval_ms = HOST_HEADER.unpack_from(data, 0)
+        if magic != HOST_MAGIC or version != 1 or not count: raise ValueError("unexpected header")
+        offset = HOST_HEADER.size + name_length
+        name = data[HOST_HEADER.size:offset].decode("utf-8", "replace")
+        host = self.hosts.get(name)
+        if host is None:
+            if len(self.hosts) >= self.max_hosts: raise ValueError(f"host limit of {self.max_hosts} reached, '{name}' ignored")
+            host = self.hosts[name] = RemoteHost(name)
+        host.address = address
+        host.last_seen = now
+        host.period = max(0.1, interval_ms * count / 1000)
+        host.frames += 1
+        host.bytes += len(data)
+        if flags & HOST_KEYFRAME: host.state = [0] * len(HOST_FIELDS)
+        elif host.seq is None or seq != (host.seq + 1) & 0xffffffff:
+            # Lost or reordered datagram: deltas no longer apply, wait for the next keyframe.
+            if host.seq is not None: host.resyncs += 1
+            host.seq = None
+            return
+        state = list(host.state)
+        for _ in range(count):
+            offset_ms, offset = read_varint(data, offset)
+            present, changed = data[offset], data[offset + 1]
+            offset += 2
+            for index in range(len(HOST_FIELDS)):
+                if changed >> index & 1:
+                    delta, offset = read_varint(data, offset)
+                    state[index] += delta
+        host.state = state
+        host.seq = seq
+        value = lambda index: state[index] / HOST_FIELDS[index][1] if present >> index & 1 else None
+        snapshot = {
+            "cpu": value(0), "ram": value(1), "temp": value(2),
+            "net": (value(3), value(4)) if present & 0b11000 == 0b11000 else None,
+            "battery": BatteryState(value(5), bool(present & HOST_PLUGGED)) if present & 0b100000 else None,
+        }
+        host.latest = (base + offset_ms / 1000, snapshot)
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        rows = []
+        for name, host in sorted(self.hosts.items()):
+            age = now - host.last_seen
+            rows.append((name, host.latest[1], age, age > host.period * self.stale_periods))
+        return rows
+
+    def stop(self):
+        self._stop.set()
+        self.sock.close()
+
+ALERT_METRICS = {
+    "cpu": lambda s: s.get("cpu"),
+    "ram": lambda s: s.get("ram"),
+    "temp": lambda s: s.get("temp"),
+    "battery": lambda s: s["battery"].percent if s.get("battery") else None,
+    "net_up": lambda s: s["net"][0] / 1e6 if s.get("net") else None,
+    "net_down": lambda s: s["net"][1] / 1e6 if s.get("net") else None,
+}
+ALERT_COLORS = {"warn": "#ffb020", "crit": "#ff4040"}
+AlertRule = namedtuple("AlertRule", "metric read above threshold clear sustain level notify text")
+
+def parse_alert_rule(line):
+    # "<metric> >|< <value> [for <seconds>] [clear <value>] [warn|crit] [notify]", net_* in Mbit/s,
+    # e.g. "temp > 90 for 5 clear 85 crit notify" fires after 5 s above 90 °C and clears below 85 °C.
+    parts = line.split()
+    if len(parts) < 3 or parts[0] not in ALERT_METRICS or parts[1] not in (">", "<"):
+        raise ValueError(f"Expected '<{'|'.join(ALERT_METRICS)}> >|< <value> ...': {line}")
+    try:
+        threshold = float(parts[2])
+        clear, sustain, level, notify = threshold, 0.0, "warn", False
+        options = iter(parts[3:])
+        for word in options:
+            if word == "for": sustain = float(next(options))
+            elif word == "clear": clear = float(next(options))
+            elif word in ALERT_COLORS: level = word
+            elif word == "notify": notify = True
+            else: raise ValueError(f"Unknown option '{word}'")
+    except (ValueError, StopIteration) as e: raise ValueError(f"{str(e) or 'Missing value'}: {line}")
+    above = parts[1] == ">"
+    if clear > threshold if above else clear < threshold: raise ValueError(f"'clear' must be on the safe side of {threshold:g}: {line}")
+    return AlertRule(parts[0], ALERT_METRICS[parts[0]], above, threshold, clear, sustain, level, notify, line.strip())
+
+class AlertEngine:
+    # Rules are parsed once; evaluate() only reads the snapshot the overlay already sampled.
+    def __init__(self, rules):
+        self.rules = rules
+        self.since = [None] * len(rules)
+        self.active = [False] * len(rules)
+        self.firing = {}
+
+    def evaluate(self, snapshot, now):
+        started = []
+        firing = {}
+        for index, rule in enumerate(self.rules):
+            value = rule.read(snapshot)
+            if value is not None:
+                if self.active[index]:
+                    if value <= rule.clear if rule.above else value >= rule.clear:
+                        self.active[index] = False
+                        self.since[index] = None
+                elif value > rule.threshold if rule.above else value < rule.threshold:
+                    if self.since[index] is None: self.since[index] = now
+                    if now - self.since[index] >= rule.sustain:
+                        self.active[index] = True
+                        started.append((rule, value))
+                else: self.since[index] = None
+            if self.active[index] and firing.get(rule.metric) != "crit": firing[rule.metric] = rule.level
+        self.firing = firing
+        return started
+
+def latest_session_path(directory=SESSIONS_PATH):
+    try: paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".evr")]
+    except OSError: return None
+    return max(paths, key=os.path.getmtime) if paths else None
+
+HEAT_COLORS = tuple(f"#{min(255, int(510 * i / 10)):02x}{min(255, int(510 * (10 - i) / 10)):02x}00" for i in range(11))
+
+def compile_nic_filter(text):
+    patterns = [pattern.strip().lower() for pattern in text.split(",") if pattern.strip()]
+    if not patterns: return lambda name: True
+    return lambda name: any(fnmatch.fnmatch(name.lower(), pattern) for pattern in patterns)
+
+class ScreenOverlayApp:
+    def __init__(self, provider=psutil, settings=None, interactive=True):
+        if interactive: threading.Thread(target=self.lower_own_priority, name="startup", daemon=True).start()
+
+        self.provider = provider
+        self.settings = settings if settings is not None else self.load_settings()
+        self.settings_store = SettingsStore()
+        self.changed_settings = set()
+        self._apply_job = None
         self.root = None
         self.overlay_window = None
         self.info_window = None
@@ -71,54 +1748,194 @@ class ScreenOverlayApp:
         self.info_label = None
         self.settings_icon = None
         self.info_frame = None
+        self.app_icon = None
+        self.icon_image = None
+        self._icon_lock = threading.Lock()
+        self.settings_vars = {}
+        self.font_slider = None
+        self.alpha_slider = None
+        self.startup_marks = {"imports": (IMPORTS_DONE - STARTUP_STARTED) * 1000}
+        self.scheduler = None
+        self.graph_frame = None
+        self.graphs = []
+        self.detail_frame = None
+        self.heat_canvas = None
+        self.heat_cells = []
+        self.heat_levels = []
+        self.heat_text = None
+        self.nic_label = None
+        self.nic_filter = compile_nic_filter(self.settings.get("nic_filter", ""))
+        self.debug_label = None
+        self.history = MetricHistory()
+        self.spike_detector = SpikeDetector(self.settings, provider)
+        self.cleaner = None
+        self.cleanup_progress = None
+        self.cleanup_status = None
+        self.cleanup_cancel_button = None
+        self.recorder = None
+        self.replay = None
+        self._recorded_spike = None
+        self.latest_snapshot = None
+        self.latest_time = None
+        self.exporter = None
+        self.shared_block = None
+        self.priority_manager = None
+        self.priority_rules_text = None
+        self.priority_status = None
+        self.host_viewer = None
+        self.alerts = None
+        self.alert_rules_text = None
+        self.info_font = None
+        self.info_char_width = 1
+        self._info_painted = None
+        if interactive:
+            # Headless instances (agent mode, the benchmark) only sample: a recorder, exporter or shared block there
+            # would publish nothing and would compete with a local overlay for its port and shared memory name.
+            self.sync_recorder()
+            self.sync_exporters()
+            self.sync_alerts()
+            self.sync_priority_manager()
+            self.sync_host_viewer()
         self.current_state = 0
         self._offset_x = 0
         self._offset_y = 0
 
-        self.last_net_io = psutil.net_io_counters()
-        self.last_net_time = time.time()
+        self.instrumentation = Instrumentation()
+        self.engine = create_collector_engine(provider)
+        self.engine.instrumentation = self.instrumentation
+        self.engine.add(MetricCollector("self", SelfStatsMeter(self.instrumentation, self.settings, provider), ("show_debug", "stats_log"), interval_scale=2.5, timeout=5.0))
+        self.engine.configure(self.settings)
+        self.refresh_interval()
+        self.engine.start(paused=True)
 
-        self.setup_hotkey_listener()
-        threading.Thread(target=self.run_tkinter_app, daemon=True).start()
+        if interactive:
+            self.setup_hotkey_listener()
+            threading.Thread(target=self.run_tkinter_app, name="tk-ui", daemon=True).start()
+
+    def lower_own_priority(self):
+        try:
+            p = psutil.Process(os.getpid())
+            if os.name == 'nt':
+                p.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        except Exception as e:
+            print(f"Priority error: {e}")
+
+    def get_icon_image(self):
+        # Decoded once and shared by the tray icon and the Tk windows.
+        with self._icon_lock:
+            if self.icon_image is None:
+                from PIL import Image, ImageDraw
+                try:
+                    image = Image.open(ICON_PATH)
+                    image.load()
+                except:
+                    image = Image.new("RGB", (64, 64), "black")
+                    ImageDraw.Draw(image).text((10, 20), "EC", fill="red")
+                self.icon_image = image
+            return self.icon_image
+
+    def mark_startup(self, name):
+        self.startup_marks[name] = (time.perf_counter() - STARTUP_STARTED) * 1000
+        if name != "imports" and all(key in self.startup_marks for key in ("first_paint", "tray_ready")): self.report_startup()
+
+    def report_startup(self):
+        report = {key: round(value, 1) for key, value in self.startup_marks.items()}
+        print("Startup (ms): " + ", ".join(f"{key} {value}" for key, value in report.items()))
+        try:
+            os.makedirs(APP_DATA_PATH, exist_ok=True)
+            with open(STARTUP_FILE, 'w') as f:
+                json.dump(report, f, indent=4)
+        except OSError: pass
 
     def run_cleanup_in_thread(self):
-        if messagebox.askyesno("Confirm", "Delete temporary files?", parent=self.settings_window):
-            threading.Thread(target=self.clear_temp_files, daemon=True).start()
-
-    def clear_temp_files(self):
-        temp_folders = [os.environ.get('TEMP'), os.path.join(os.environ.get('SystemRoot'), 'Temp'), os.path.join(os.environ.get('SystemRoot'), 'Prefetch'), os.path.join(os.environ.get('SystemRoot'), 'SoftwareDistribution', 'Download')]
-        deleted_count, total_size = 0, 0
-        self.root.after(0, lambda: self.settings_window.title("Cleaning..."))
-        for folder in temp_folders:
-            if folder and os.path.exists(folder):
-                for item_name in os.listdir(folder):
-                    item_path = os.path.join(folder, item_name)
-                    try:
-                        size = os.path.getsize(item_path)
-                        if os.path.isfile(item_path): os.remove(item_path)
-                        elif os.path.isdir(item_path): shutil.rmtree(item_path, ignore_errors=True)
-                        deleted_count += 1
-                        total_size += size
-                    except (PermissionError, FileNotFoundError, OSError): continue
+        if self.cleaner: return
+        self.cleaner = TempCleaner(temp_folders(), progress=lambda count, done, total: self.root.after(0, self.show_cleanup_progress, count, done, total))
+        self.show_cleanup_status("Scanning...", running=True)
+        threading.Thread(target=self.scan_temp_files, args=(self.cleaner,), daemon=True).start()
+
+    def scan_temp_files(self, cleaner):
+        results = cleaner.scan()
+        self.root.after(0, self.confirm_cleanup, cleaner, results)
+
+    def confirm_cleanup(self, cleaner, results):
+        if cleaner.cancelled.is_set():
+            self.finish_cleanup("Cancelled.")
+            return
+        lines = [f"{os.path.basename(folder) or folder}: {count} files, {self.format_size(size)}" for folder, (count, size) in results.items()]
+        lines.append(f"\nTotal reclaimable: {self.format_size(cleaner.total_bytes)}")
+        if not messagebox.askyesno("Confirm", "Delete temporary files?\n\n" + "\n".join(lines), parent=self.settings_window):
+            self.finish_cleanup("")
+            return
+        self.show_cleanup_status("Cleaning...", running=True)
+        threading.Thread(target=self.clear_temp_files, args=(cleaner,), daemon=True).start()
+
+    def clear_temp_files(self, cleaner):
+        results = cleaner.clean()
+        deleted_count = sum(count for count, _ in results.values())
+        total_size = sum(size for _, size in results.values())
         total_size_mb = total_size / (1024 * 1024)
         message = f"Deleted {deleted_count} files.\nFreed {total_size_mb:.2f} MB."
-        self.root.after(0, lambda: self.settings_window.title("Settings"))
-        messagebox.showinfo("Done", message, parent=self.settings_window)
+        if cleaner.cancelled.is_set(): message = "Cancelled.\n" + message
+        self.root.after(0, self.finish_cleanup, message)
+
+    def cancel_cleanup(self):
+        if self.cleaner: self.cleaner.cancel()
+
+    def finish_cleanup(self, message):
+        self.cleaner = None
+        self.show_cleanup_status("", running=False)
+        if message: messagebox.showinfo("Done", message, parent=self.settings_window)
+
+    def show_cleanup_status(self, text, running):
+        try:
+            self.settings_window.title("Cleaning..." if running else "Settings")
+            self.cleanup_status.config(text=text)
+            self.cleanup_progress.config(value=0)
+            self.cleanup_cancel_button.config(state='normal' if running else 'disabled')
+        except (tk.TclError, AttributeError): pass
+
+    def show_cleanup_progress(self, count, done, total):
+        try:
+            self.cleanup_progress.config(value=100 * done / total if total else 0)
+            self.cleanup_status.config(text=f"{count} files, {self.format_size(done)} / {self.format_size(total)}")
+        except (tk.TclError, AttributeError): pass
 #make by　まそん
     def save_settings(self):
-        os.makedirs(APP_DATA_PATH, exist_ok=True)
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(self.settings, f, indent=4)
+        self.settings_store.save(self.settings)
 
     def load_settings(self):
-        settings = DEFAULT_SETTINGS.copy()
+        user_settings = {}
         if os.path.exists(CONFIG_FILE):
             try:
-                with open(CONFIG_FILE, 'r') as f:
+                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                     user_settings = json.load(f)
-                    settings.update(user_settings)
-            except (json.JSONDecodeError, KeyError): pass
-        return settings
+            except (OSError, ValueError) as e: print(f"Settings load error: {e}")
+        return validate_settings(user_settings)
+
+    def update_settings(self, changes, delay=150):
+        # Every settings change goes through here; bursts (slider drags) are applied and saved once they settle.
+        changes = {key: value for key, value in changes.items() if self.settings.get(key) != value}
+        if not changes: return
+        self.settings.update(changes)
+        self.changed_settings.update(changes)
+        if self._apply_job: self.root.after_cancel(self._apply_job)
+        self._apply_job = self.root.after(delay, self.flush_settings)
+
+    def flush_settings(self):
+        self._apply_job = None
+        changed, self.changed_settings = self.changed_settings, set()
+        if any(key.startswith("priority_") for key in changed): self.sync_priority_manager()
+        if changed & {"alerts_enabled", "alert_rules"}: self.sync_alerts()
+        self.sync_recorder()
+        self.sync_exporters()
+        self.sync_host_viewer()
+        self.engine.configure(self.settings)
+        self.spike_detector.configure(self.settings)
+        self.sync_spike_detector()
+        self.refresh_interval()
+        self.apply_settings()
+        self.sync_background()
+        self.save_settings()
 
     def set_click_through(self, hwnd):
         try:
@@ -137,10 +1954,6 @@ class ScreenOverlayApp:
     def create_windows(self):
         self.root = tk.Tk()
         self.root.withdraw()
-        try:
-            pil_icon = Image.open(ICON_PATH)
-            self.app_icon = ImageTk.PhotoImage(pil_icon)
-        except: self.app_icon = None
         self.overlay_window = tk.Toplevel(self.root)
         self.overlay_window.geometry(f"{self.root.winfo_screenwidth()}x{self.root.winfo_screenheight()}+0+0")
         self.overlay_window.overrideredirect(True)
@@ -157,16 +1970,30 @@ class ScreenOverlayApp:
         self.info_frame.pack()
         self.settings_icon = tk.Label(self.info_frame, text="⚙️", font=("Arial", 10))
         self.settings_icon.grid(row=0, column=0, sticky="nw", padx=5, pady=5)
-        self.info_label = tk.Label(self.info_frame, justify=tk.LEFT, padx=10, pady=5)
+        self.info_label = tk.Text(self.info_frame, padx=10, pady=5, bd=0, highlightthickness=0, wrap="none", cursor="arrow",
+                                  takefocus=0, exportselection=False, width=1, height=1, state="disabled")
         self.info_label.grid(row=0, column=1, sticky="w")
+        self.graph_frame = tk.Frame(self.info_frame)
+        self.graph_frame.grid(row=1, column=1, sticky="w", padx=10, pady=(0, 5))
+        self.detail_frame = tk.Frame(self.info_frame)
+        self.detail_frame.grid(row=2, column=1, sticky="w", padx=10, pady=(0, 5))
+        self.heat_canvas = tk.Canvas(self.detail_frame, height=16, highlightthickness=0, bd=0)
+        self.heat_canvas.pack(anchor="w")
+        self.nic_label = tk.Label(self.detail_frame, justify=tk.LEFT)
+        self.nic_label.pack(anchor="w")
+        self.debug_label = tk.Label(self.info_frame, justify=tk.LEFT, padx=10)
+        self.debug_label.grid(row=3, column=0, columnspan=2, sticky="w", pady=(0, 5))
         self.settings_icon.bind("<Button-1>", self.open_settings_window)
         self.info_frame.bind("<ButtonPress-1>", self.start_move)
         self.info_frame.bind("<B1-Motion>", self.do_move)
-        self.info_label.bind("<ButtonPress-1>", self.start_move)
-        self.info_label.bind("<B1-Motion>", self.do_move)
+        self.info_label.bind("<ButtonPress-1>", lambda event: self.start_move(event) or "break")
+        self.info_label.bind("<B1-Motion>", lambda event: self.do_move(event) or "break")
         self.info_window.withdraw()
+        self.scheduler = RefreshScheduler(self.root, self.tick, self.refresh_interval())
+        self.scheduler.instrumentation = self.instrumentation
         self.apply_settings()
-        self.update_info()
+        self.sync_background()
+        self.mark_startup("first_paint")
         self.root.mainloop()
 #make by まそん
     def apply_settings(self):
@@ -174,9 +2001,18 @@ class ScreenOverlayApp:
         colors = COLOR_THEMES.get(theme_name, COLOR_THEMES["標準 (灰色)"])
         bg_color, fg_color = colors["bg"], colors["fg"]
         self.info_frame.config(bg=bg_color)
-        self.info_label.config(font=("Arial", self.settings["font_size"], "bold"), bg=bg_color, fg=fg_color)
+        self.info_font = tk.font.Font(root=self.root, family="Arial", size=self.settings["font_size"], weight="bold")
+        self.info_char_width = max(1, self.info_font.measure("0"))
+        self.info_label.config(font=self.info_font, bg=bg_color, fg=fg_color)
+        for level, color in ALERT_COLORS.items(): self.info_label.tag_configure(level, foreground=color)
+        self._info_painted = None
         self.settings_icon.config(bg=bg_color, fg=fg_color)
         self.overlay_window.wm_attributes("-alpha", self.settings["alpha"])
+        self.build_graphs(bg_color, fg_color)
+        self.build_details(bg_color, fg_color)
+        self.debug_label.config(font=("Consolas", max(7, self.settings["font_size"] - 4)), bg=bg_color, fg=fg_color)
+        if self.settings.get("show_debug", False): self.debug_label.grid()
+        else: self.debug_label.grid_remove()
         self.update_info()
         self.info_window.update_idletasks()
         info_width = self.info_window.winfo_width()
@@ -191,63 +2027,289 @@ class ScreenOverlayApp:
         elif bytes_per_second < 1024 * 1024: return f"{bytes_per_second / 1024: >4.0f} KB/s"
         else: return f"{bytes_per_second / (1024 * 1024): >4.1f} MB/s"
 
-    def update_info(self):
+    def format_size(self, num_bytes):
+        if num_bytes < 1024 * 1024: return f"{num_bytes / 1024:.0f} KB"
+        elif num_bytes < 1024 * 1024 * 1024: return f"{num_bytes / (1024 * 1024):.1f} MB"
+        else: return f"{num_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+    def build_graphs(self, bg_color, fg_color):
+        for graph in self.graphs: graph.canvas.destroy()
+        self.graphs = []
+        self.graph_frame.config(bg=bg_color)
+        if not self.settings.get("show_graphs", False):
+            self.graph_frame.grid_remove()
+            return
+        points = int(self.settings.get("graph_points", 60))
+        height = max(16, self.settings["font_size"] * 2)
+        for key, label, setting, max_value in GRAPH_METRICS:
+            if not self.settings.get(setting, True): continue
+            graph = Sparkline(self.graph_frame, self.history.rings[key], label, points, max_value, height=height, bg=bg_color, fg=fg_color)
+            graph.canvas.pack(anchor="w", pady=1)
+            self.graphs.append(graph)
+        self.graph_frame.grid()
+
+    def build_details(self, bg_color, fg_color):
+        self.nic_filter = compile_nic_filter(self.settings.get("nic_filter", ""))
+        self.heat_canvas.delete("all")
+        self.heat_cells, self.heat_levels = [], []
+        self.heat_text = None
+        self.detail_frame.config(bg=bg_color)
+        self.heat_canvas.config(bg=bg_color, height=max(12, self.settings["font_size"] + 4))
+        self.nic_label.config(font=("Consolas", max(8, self.settings["font_size"] - 2)), bg=bg_color, fg=fg_color, text="")
+        if self.settings.get("show_details", False): self.detail_frame.grid()
+        else: self.detail_frame.grid_remove()
+
+    def update_details(self, snapshot):
+        cores = snapshot.get("percpu")
+        if cores:
+            count = len(cores.percent)
+            if len(self.heat_cells) != count:
+                # Cells are created once per core count; later ticks only recolor them.
+                self.heat_canvas.delete("all")
+                height = int(self.heat_canvas.cget("height"))
+                cell = max(6, min(16, 256 // count))
+                self.heat_cells = [self.heat_canvas.create_rectangle(i * cell, 0, (i + 1) * cell - 1, height - 1, width=0) for i in range(count)]
+                self.heat_levels = [-1] * count
+                self.heat_text = self.heat_canvas.create_text(count * cell + 6, height // 2, anchor="w", fill=self.nic_label.cget("fg"), font=self.nic_label.cget("font"))
+                self.heat_canvas.config(width=count * cell + 140)
+            for i, percent in enumerate(cores.percent):
+                level = int(percent + 5) // 10
+                if level != self.heat_levels[i]:
+                    self.heat_levels[i] = level
+                    self.heat_canvas.itemconfig(self.heat_cells[i], fill=HEAT_COLORS[level])
+            peak = max(cores.percent)
+            freq = f" @ {sum(cores.freq_mhz) / len(cores.freq_mhz) / 1000:.1f} GHz" if cores.freq_mhz else ""
+            self.heat_canvas.itemconfig(self.heat_text, text=f"max {peak:.0f}%{freq}")
+        nics = snapshot.get("pernic")
+        if nics:
+            rows = [f"{name[:12]:<12} ↑{self.format_speed(sent)} ↓{self.format_speed(recv)}" for name, (sent, recv) in zip(nics.names, nics.rates) if self.nic_filter(name)]
+            self.nic_label.config(text="\n".join(rows))
+
+    def tick(self):
+        if self.current_state == 0 and not self.replay: return self.background_tick()
+        snapshot = self.replay.next_snapshot() if self.replay else None
+        if self.replay and snapshot is None: self.stop_replay()
+        if snapshot is None: snapshot = self.engine.snapshot()
+        self.history.push(snapshot)
+        event = self.spike_detector.last_event
+        spike = event is not None and event is not self._recorded_spike
+        self._recorded_spike = event
+        if not self.replay:
+            self.latest_snapshot, self.latest_time = snapshot, time.time()
+            if self.recorder: self.recorder.append(snapshot, spike=spike)
+            if self.shared_block: self.shared_block.publish(snapshot, spike)
+            if self.alerts: self.notify_alerts(self.alerts.evaluate(snapshot, time.monotonic()))
+        self.update_info(snapshot)
+        for graph in self.graphs: graph.push()
+        if self.settings.get("show_details", False): self.update_details(snapshot)
+        if self.settings.get("show_debug", False): self.update_debug(snapshot)
+        # Replayed battery state must not stretch the live sampling interval.
+        if not self.replay: self.refresh_interval(snapshot)
+
+    def background_tick(self):
+        # Overlay hidden: keep exporters and alert rules fed without touching any widgets.
+        snapshot = self.engine.snapshot()
+        self.history.push(snapshot)
+        self.latest_snapshot, self.latest_time = snapshot, time.time()
+        if self.shared_block: self.shared_block.publish(snapshot)
+        if self.alerts: self.notify_alerts(self.alerts.evaluate(snapshot, time.monotonic()))
+        self.refresh_interval(snapshot)
+
+    def background_alert_collectors(self):
+        # Opt-in: only the collectors read by notify rules (net_up/net_down -> net) sample while hidden.
+        if not self.alerts or not self.settings.get("alert_background", False) or not self.settings.get("alert_notifications", True): return set()
+        return {rule.metric.split("_")[0] for rule in self.alerts.rules if rule.notify}
+
+    def sync_background(self):
+        # While hidden the engine and scheduler only keep running (at background_interval_scale) for consumers
+        # that need fresh samples; otherwise hiding the overlay stops all sampling.
+        if self.current_state != 0 or not self.scheduler: return
+        if self.exporter or self.shared_block:
+            self.engine.resume()
+            sampling = True
+        else:
+            keep = self.background_alert_collectors()
+            sampling = bool(keep)
+            # stats.log has to cover hidden use too, so the self collector keeps running while it is on.
+            if self.settings.get("stats_log", False): keep.add("self")
+            self.engine.pause(keep=keep)
+        if sampling:
+            self.refresh_interval()
+            self.scheduler.start(delay=0.15)
+        else: self.scheduler.stop()
+
+    def update_debug(self, snapshot):
+        lines = []
+        stats = snapshot.get("self")
+        if stats:
+            budget = self.settings.get("cpu_budget_percent", 1.0)
+            over = " ⚠" if stats.cpu_percent > budget else ""
+            lines.append(f"self  cpu {stats.cpu_percent:.1f}% / {budget:.1f}%{over}  rss {stats.rss / (1024 * 1024):.1f} MB  threads {stats.threads}")
+            groups = {}
+            for name in stats.thread_names:
+                group = "pystray" if name == "MainThread" else name.split("-")[0] if name.startswith("collector-") else name
+                groups[group] = groups.get(group, 0) + 1
+            lines.append("      " + ", ".join(f"{name}×{count}" if count > 1 else name for name, count in groups.items()))
+        for name, summary in sorted(self.instrumentation.summary().items()):
+            lines.append(f"{name[:16]:<16} p50 {summary['p50_ms']:>6.2f}  p95 {summary['p95_ms']:>6.2f}  max {summary['max_ms']:>7.2f} ms")
+        temp_sensor, power_meter = self.engine.collectors["temp"].func, self.engine.collectors["power"].func
+        freq = snapshot.get("freq")
+        sensors = f"sensors  temp {temp_sensor.description or 'none'}  power {power_meter.name or 'none'}"
+        if freq and freq.ratio is not None: sensors += f"  freq {freq.ratio * 100:.0f}% of max"
+        lines.append(sensors)
+        lines.append("startup  " + "  ".join(f"{key} {value:.0f}" for key, value in self.startup_marks.items()) + " ms")
+        self.debug_label.config(text="\n".join(lines))
+
+    def toggle_debug(self):
+        self.update_settings({"show_debug": not self.settings.get("show_debug", False)}, delay=0)
+
+    def update_info(self, snapshot=None):
+        if snapshot is None: snapshot = self.engine.snapshot()
         info_parts = []
-        if self.settings.get("show_cpu", True): info_parts.append(f"💻 CPU: {psutil.cpu_percent():>5.1f} %")
-        if self.settings.get("show_ram", True): info_parts.append(f"🧠 RAM: {psutil.virtual_memory().percent:>5.1f} %")
+        firing = self.alerts.firing if self.alerts and not self.replay else {}
+        line_levels = {}
+
+        def mark(metric):
+            if metric in firing: line_levels[len(info_parts) - 1] = firing[metric]
+
+        if self.settings.get("show_cpu", True):
+            cpu = snapshot.get("cpu")
+            info_parts.append(f"💻 CPU: {cpu:>5.1f} %" if cpu is not None else "💻 CPU:   N/A")
+            mark("cpu")
+        if self.settings.get("show_ram", True):
+            ram = snapshot.get("ram")
+            info_parts.append(f"🧠 RAM: {ram:>5.1f} %" if ram is not None else "🧠 RAM:   N/A")
+            mark("ram")
         if self.settings.get("show_temp", True):
-            try:
-                temps = psutil.sensors_temperatures()
-                if 'coretemp' in temps and temps['coretemp']:
-                    cpu_temp = temps['coretemp'][0].current
-                    info_parts.append(f"🌡️ TEMP: {cpu_temp: >4.0f} °C")
-                else: info_parts.append("🌡️ TEMP:    N/A")
-            except Exception: info_parts.append("🌡️ TEMP:    N/A")
+            cpu_temp = snapshot.get("temp")
+            if cpu_temp is not None: info_parts.append(f"🌡️ TEMP: {cpu_temp: >4.0f} °C")
+            else: info_parts.append("🌡️ TEMP:    N/A")
+            mark("temp")
         if self.settings.get("show_network", True):
-            current_net_io = psutil.net_io_counters()
-            current_time = time.time()
-            elapsed_time = current_time - self.last_net_time
-            if elapsed_time > 0:
-                sent_speed = (current_net_io.bytes_sent - self.last_net_io.bytes_sent) * 8 / elapsed_time
-                recv_speed = (current_net_io.bytes_recv - self.last_net_io.bytes_recv) * 8 / elapsed_time
+            net = snapshot.get("net")
+            if net is not None:
+                sent_speed, recv_speed = net
                 info_parts.append(f"📤 NET: {self.format_speed(sent_speed)}")
+                mark("net_up")
                 info_parts.append(f"📥 NET: {self.format_speed(recv_speed)}")
-            self.last_net_io = current_net_io
-            self.last_net_time = current_time
+                mark("net_down")
+            else:
+                info_parts.append("📤 NET:    N/A")
+                info_parts.append("📥 NET:    N/A")
+
+        battery = snapshot.get("battery")
 
-        battery = psutil.sensors_battery()
-        
         if self.settings.get("show_battery", True):
             if battery:
                 plugged_status = " 接続" if battery.power_plugged else ""
-                info_parts.append(f"🔋 BAT: {battery.percent}%{plugged_status}")
+                info_parts.append(f"🔋 BAT: {battery.percent:.0f}%{plugged_status}")
             else:
                 info_parts.append("🔋 BAT: N/A")
+            mark("battery")
+
+        power = snapshot.get("power")
 
         if self.settings.get("show_voltage", False):
-            info_parts.append("⚡ VOLT: N/A")
+            info_parts.append(f"⚡ VOLT: {power.voltage:.2f} V" if power and power.voltage is not None else "⚡ VOLT: N/A")
 
         if self.settings.get("show_amperage", False):
-            info_parts.append("🔌 AMP:  N/A")
+            info_parts.append(f"🔌 AMP:  {power.current:.2f} A" if power and power.current is not None else "🔌 AMP:  N/A")
+
+        if self.settings.get("show_throttle", True):
+            throttle = detect_throttling(snapshot, self.settings)
+            if throttle:
+                freq = snapshot["freq"]
+                info_parts.append(f"🐢 THROTTLE: {freq.current / 1000:.1f}/{freq.max / 1000:.1f} GHz ({throttle})")
 
         if self.settings.get("show_time", True):
             time_format = "%I:%M:%S %p" if self.settings.get("time_format") == "12h" else "%H:%M:%S"
             info_parts.append(f"🕒 TIME: {datetime.now().strftime(time_format)}")
-        if not info_parts:
-            self.info_label.config(text="Open Settings ⚙️")
-        else:
-            self.info_label.config(text="\n".join(info_parts))
-        
-        update_ms = int(self.settings.get("update_interval", 2.0) * 1000)
-        self.root.after(update_ms, self.update_info)
+
+        if self.host_viewer:
+            for name, remote, age, stale in self.host_viewer.snapshot():
+                info_parts.append(self.format_host_line(name, remote, age, stale))
+
+        event = self.spike_detector.last_event
+        if event and self.settings.get("spike_capture", False) and time.time() - event.time < 10:
+            culprit = f" {event.top_processes[0][1]}" if event.top_processes else ""
+            info_parts.append(f"⚠️ SPIKE: {event.reason}{culprit}")
+
+        replay_time = snapshot.get("replay_time")
+        if replay_time is not None:
+            info_parts.append(f"⏪ REPLAY: {datetime.fromtimestamp(replay_time).strftime('%m/%d %H:%M:%S')}")
+        paint_started = time.perf_counter()
+        self.paint_info("\n".join(info_parts) if info_parts else "Open Settings ⚙️", line_levels)
+        self.instrumentation.record("paint.info_label", time.perf_counter() - paint_started)
+
+    def paint_info(self, text, line_levels):
+        # info_label is a read-only Text so single lines can carry an alert color; it is sized to its content.
+        if (text, line_levels) == self._info_painted: return
+        self._info_painted = (text, line_levels)
+        lines = text.split("\n")
+        label = self.info_label
+        label.config(state="normal")
+        label.delete("1.0", "end")
+        label.insert("1.0", text)
+        for index, level in line_levels.items(): label.tag_add(level, f"{index + 1}.0", f"{index + 1}.end")
+        width = max(self.info_font.measure(line) for line in lines)
+        label.config(state="disabled", height=len(lines), width=-(-width // self.info_char_width) + 1)
+
+    def sync_alerts(self):
+        self.alerts = None
+        if not self.settings.get("alerts_enabled", True): return
+        rules = []
+        for line in self.settings.get("alert_rules", []):
+            try: rules.append(parse_alert_rule(line))
+            except ValueError as e: print(f"Alert rule ignored: {e}")
+        if rules: self.alerts = AlertEngine(rules)
+
+    def notify_alerts(self, started):
+        if not started or not self.icon or not self.settings.get("alert_notifications", True): return
+        for rule, value in started:
+            if not rule.notify: continue
+            try: self.icon.notify(f"{rule.metric.upper()} {value:.1f} ({'>' if rule.above else '<'} {rule.threshold:g})", "EvlonClient")
+            except Exception as e: print(f"Notification error: {e}")
+
+    def format_host_line(self, name, snapshot, age, stale):
+        if stale or snapshot is None: return f"🖥️ {name}: STALE ({age:.0f}s)"
+        parts = [f"🖥️ {name}:"]
+        if snapshot["cpu"] is not None: parts.append(f"CPU {snapshot['cpu']:.0f}%")
+        if snapshot["ram"] is not None: parts.append(f"RAM {snapshot['ram']:.0f}%")
+        if snapshot["temp"] is not None: parts.append(f"{snapshot['temp']:.0f}°C")
+        if snapshot["net"] is not None: parts.append(f"↑{self.format_speed(snapshot['net'][0]).strip()} ↓{self.format_speed(snapshot['net'][1]).strip()}")
+        return " ".join(parts)
+
+    def refresh_interval(self, snapshot=None):
+        interval = float(self.settings.get("update_interval", 2.0))
+        battery = (snapshot if snapshot is not None else self.engine.snapshot()).get("battery")
+        if battery is not None and battery.power_plugged is False:
+            interval *= self.settings.get("battery_interval_scale", 2.0)
+        if self.current_state == 0: interval *= self.settings.get("background_interval_scale", 2.0)
+        interval = min(max(interval, self.settings.get("min_update_interval", 0.5)), self.settings.get("max_update_interval", 10.0))
+        self.engine.set_interval(interval)
+        if self.scheduler: self.scheduler.interval = interval
+        return interval
+
+    def request_toggle(self):
+        # Hotkey and tray callbacks run on their own threads; the scheduler and engine are only driven from Tk.
+        if self.root: self.root.after(0, self.toggle_overlay)
 
     def toggle_overlay(self):
         if not self.root: return
         self.current_state = (self.current_state + 1) % 3
         if self.current_state == 0:
+            self.spike_detector.stop()
             self.overlay_window.withdraw()
             self.info_window.withdraw()
+            self.sync_background()
         elif self.current_state == 1:
+            self.engine.resume()
+            self.refresh_interval()
+            # Give the collectors a moment to replace the samples taken before the pause.
+            self.scheduler.stop()
+            self.scheduler.start(delay=0.15)
+            for graph in self.graphs: graph.redraw()
+            self.sync_spike_detector()
             self.set_clickable(self.info_window.winfo_id())
             self.settings_icon.grid()
             self.overlay_window.deiconify()
@@ -258,6 +2320,113 @@ class ScreenOverlayApp:
             self.overlay_window.withdraw()
             self.info_window.deiconify()
 
+    def sync_recorder(self):
+        if self.settings.get("record_sessions", False):
+            if not self.recorder:
+                self.recorder = SessionRecorder(batch_size=int(self.settings.get("record_batch", 30)), max_bytes=int(self.settings.get("record_max_mb", 16) * 1024 * 1024))
+        elif self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def sync_exporters(self):
+        port = int(self.settings.get("export_port", 9465))
+        if self.exporter and (not self.settings.get("export_http", False) or self.exporter.port != port):
+            self.exporter.stop()
+            self.exporter = None
+        if self.settings.get("export_http", False) and not self.exporter:
+            try: self.exporter = MetricsExporter(lambda: (self.latest_time, self.latest_snapshot), self.history, port)
+            except OSError as e: print(f"Metrics export error: {e}")
+        if self.settings.get("export_shared_memory", False):
+            if not self.shared_block:
+                try: self.shared_block = SharedMetricsBlock()
+                except (OSError, ValueError) as e: print(f"Shared memory error: {e}")
+        elif self.shared_block:
+            self.shared_block.close()
+            self.shared_block = None
+
+    def sync_host_viewer(self):
+        port = int(self.settings.get("host_viewer_port", HOST_PORT))
+        if self.host_viewer and (not self.settings.get("host_viewer", False) or self.host_viewer.port != port):
+            self.host_viewer.stop()
+            self.host_viewer = None
+        if self.settings.get("host_viewer", False) and not self.host_viewer:
+            try: self.host_viewer = HostViewer(port, self.settings.get("host_viewer_bind", "0.0.0.0"), self.settings.get("host_stale_periods", 3.0))
+            except OSError as e: print(f"Host viewer error: {e}")
+        elif self.host_viewer: self.host_viewer.stale_periods = self.settings.get("host_stale_periods", 3.0)
+
+    def run_agent(self, target, name=None, stop=None):
+        # Headless mode: no windows, tray or hotkeys; only the collectors run and frames go to the viewer.
+        self.lower_own_priority()
+        interval = float(self.settings.get("agent_interval", 0.5))
+        self.engine.configure(dict(self.settings, show_details=False, show_debug=False, stats_log=False))
+        self.engine.set_interval(interval)
+        self.engine.resume()
+        agent = HostAgent(self.engine, target, name, interval, int(self.settings.get("agent_batch", 2)), int(self.settings.get("agent_keyframe_every", 10)))
+        print(f"Agent '{agent.name}' sending to {agent.address[0]}:{agent.address[1]} every {interval}s")
+        try: agent.run(stop or threading.Event())
+        except KeyboardInterrupt: pass
+        finally: self.quit_app()
+        return agent
+
+    def sync_priority_manager(self):
+        if self.priority_manager:
+            self.priority_manager.stop()
+            self.priority_manager = None
+        if not self.settings.get("priority_manager", False): return
+        rules = []
+        for line in self.settings.get("priority_rules", []):
+            try: rules.append(parse_priority_rule(line))
+            except ValueError as e: print(f"Priority rule ignored: {e}")
+        if rules:
+            self.priority_manager = PriorityManager(rules, self.provider, self.settings.get("priority_scan_interval", 3.0))
+            self.priority_manager.start()
+
+    def update_priority_status(self):
+        if not self.settings_window or not self.settings_window.winfo_viewable(): return
+        text = self.priority_manager.status() if self.priority_manager else "Priority manager is off."
+        self.priority_status.config(text=text)
+        self.root.after(2000, self.update_priority_status)
+
+    def start_replay(self):
+        if self.recorder: self.recorder.flush(); self.recorder.wait()
+        path = latest_session_path()
+        if not path:
+            messagebox.showinfo("Replay", "No recorded session found.")
+            return
+        try: reader = SessionReader(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Replay", f"Failed to open session: {e}")
+            return
+        self.stop_replay()
+        self.replay = SessionReplay(reader)
+        if self.current_state == 0: self.toggle_overlay()
+
+    def stop_replay(self):
+        if self.replay:
+            self.replay.reader.close()
+            self.replay = None
+
+    def export_last_session(self):
+        # The recorder buffer belongs to the Tk thread; flush it here and stream the CSV on a worker.
+        recorder = self.recorder
+        if recorder: recorder.flush()
+        threading.Thread(target=self.write_session_csv, args=(recorder,), name="session-export", daemon=True).start()
+
+    def write_session_csv(self, recorder):
+        if recorder: recorder.wait()
+        path = latest_session_path()
+        if not path: return
+        csv_path = os.path.splitext(path)[0] + ".csv"
+        try:
+            with SessionReader(path) as reader: reader.export_csv(csv_path)
+            message = f"Exported to {csv_path}"
+        except (OSError, ValueError) as e: message = f"Export failed: {e}"
+        if self.root: self.root.after(0, lambda: messagebox.showinfo("Export", message))
+
+    def sync_spike_detector(self):
+        if self.settings.get("spike_capture", False) and self.current_state != 0: self.spike_detector.start()
+        else: self.spike_detector.stop()
+
     def start_move(self, event):
         self._offset_x = event.x
         self._offset_y = event.y
@@ -274,15 +2443,37 @@ class ScreenOverlayApp:
             messagebox.showerror("Error", f"Failed to open Task Manager: {e}", parent=self.settings_window)
 
     def open_settings_window(self, event=None):
-        if self.settings_window and self.settings_window.winfo_exists():
-            self.settings_window.lift()
-            return
+        # Built once; later opens only refresh the variables and show it again.
+        if self.settings_window is None: self.build_settings_window()
+        self.sync_settings_vars()
+        was_visible = self.settings_window.winfo_viewable()
+        self.settings_window.deiconify()
+        self.settings_window.lift()
+        if not was_visible: self.root.after(100, self.update_priority_status)
+
+    def sync_settings_vars(self):
+        for key, var in self.settings_vars.items():
+            if key == "time_format": var.set(self.settings.get(key) == "12h")
+            else: var.set(self.settings.get(key, DEFAULT_SETTINGS.get(key)))
+        self.font_slider.set(self.settings["font_size"])
+        self.alpha_slider.set(self.settings["alpha"])
+        self.priority_rules_text.delete("1.0", tk.END)
+        self.priority_rules_text.insert("1.0", "\n".join(self.settings.get("priority_rules", [])))
+        self.alert_rules_text.delete("1.0", tk.END)
+        self.alert_rules_text.insert("1.0", "\n".join(self.settings.get("alert_rules", [])))
+
+    def build_settings_window(self):
         self.settings_window = tk.Toplevel(self.root)
         self.settings_window.title("Settings")
-        self.settings_window.geometry("300x750")
+        self.settings_window.geometry("340x620")
         self.settings_window.wm_attributes("-topmost", True)
         self.settings_window.config(bg="#2d2d2d")
-        if self.app_icon: self.settings_window.iconphoto(False, self.app_icon)
+        self.settings_window.protocol("WM_DELETE_WINDOW", self.settings_window.withdraw)
+        try:
+            from PIL import ImageTk
+            self.app_icon = ImageTk.PhotoImage(self.get_icon_image())
+            self.settings_window.iconphoto(False, self.app_icon)
+        except: self.app_icon = None
         
         style = ttk.Style(self.settings_window)
         style.theme_use('clam')
@@ -299,19 +2490,23 @@ class ScreenOverlayApp:
         self.settings_window.option_add('*TCombobox*Listbox.background', '#555555')
         self.settings_window.option_add('*TCombobox*Listbox.foreground', 'white')
 
-        display_frame = ttk.LabelFrame(self.settings_window, text="Display Items")
-        display_frame.pack(pady=(10,0), padx=20, fill='x')
+        style.configure('TNotebook', background='#2d2d2d', borderwidth=0)
+        style.configure('TNotebook.Tab', background='#555555', foreground='white', padding=(10, 3))
+        style.map('TNotebook.Tab', background=[('selected', '#2d2d2d')])
+
+        notebook = ttk.Notebook(self.settings_window)
+        notebook.pack(pady=(10,0), padx=10, fill='both', expand=True)
+        display_page, general_page, alerts_page, maintenance_page = ttk.Frame(notebook), ttk.Frame(notebook), ttk.Frame(notebook), ttk.Frame(notebook)
+        notebook.add(display_page, text="Display")
+        notebook.add(general_page, text="General")
+        notebook.add(alerts_page, text="Alerts")
+        notebook.add(maintenance_page, text="Maintenance")
+
+        display_frame = ttk.LabelFrame(display_page, text="Display Items")
+        display_frame.pack(pady=(10,0), padx=10, fill='x')
         
-        show_vars = {
-            "cpu": tk.BooleanVar(value=self.settings.get("show_cpu", True)),
-            "ram": tk.BooleanVar(value=self.settings.get("show_ram", True)),
-            "temp": tk.BooleanVar(value=self.settings.get("show_temp", True)),
-            "network": tk.BooleanVar(value=self.settings.get("show_network", True)),
-            "battery": tk.BooleanVar(value=self.settings.get("show_battery", True)),
-            "voltage": tk.BooleanVar(value=self.settings.get("show_voltage", False)),
-            "amperage": tk.BooleanVar(value=self.settings.get("show_amperage", False)),
-            "time": tk.BooleanVar(value=self.settings.get("show_time", True))
-        }
+        show_vars = {name: tk.BooleanVar() for name in ("cpu", "ram", "temp", "network", "battery", "voltage", "amperage", "throttle", "time", "graphs", "details")}
+        self.settings_vars = {f"show_{name}": var for name, var in show_vars.items()}
         
         ttk.Checkbutton(display_frame, text="CPU Usage", variable=show_vars["cpu"]).pack(anchor='w', padx=10)
         ttk.Checkbutton(display_frame, text="RAM Usage", variable=show_vars["ram"]).pack(anchor='w', padx=10)
@@ -322,96 +2517,173 @@ class ScreenOverlayApp:
         ttk.Checkbutton(display_frame, text="Battery Level", variable=show_vars["battery"]).pack(anchor='w', padx=10)
         ttk.Checkbutton(display_frame, text="Voltage (V)", variable=show_vars["voltage"]).pack(anchor='w', padx=10)
         ttk.Checkbutton(display_frame, text="Amperage (A)", variable=show_vars["amperage"]).pack(anchor='w', padx=10)
+        ttk.Checkbutton(display_frame, text="Throttling Warning", variable=show_vars["throttle"]).pack(anchor='w', padx=10)
         
         ttk.Separator(display_frame, orient='horizontal').pack(fill='x', pady=5, padx=10)
         ttk.Checkbutton(display_frame, text="Time", variable=show_vars["time"]).pack(anchor='w', padx=10)
+        ttk.Checkbutton(display_frame, text="Sparkline Graphs", variable=show_vars["graphs"]).pack(anchor='w', padx=10)
+        ttk.Checkbutton(display_frame, text="Per-Core / Per-NIC Detail", variable=show_vars["details"]).pack(anchor='w', padx=10)
+        ttk.Label(display_frame, text="NIC Filter (e.g. Ethernet*, Wi-Fi)").pack(pady=(5,0), padx=10, anchor='w')
+        nic_filter_var = self.settings_vars["nic_filter"] = tk.StringVar()
+        ttk.Entry(display_frame, textvariable=nic_filter_var).pack(fill="x", padx=10, pady=(0, 5))
 
-        general_frame = ttk.LabelFrame(self.settings_window, text="General")
-        general_frame.pack(pady=(10,0), padx=20, fill='x')
+        general_frame = ttk.LabelFrame(general_page, text="General")
+        general_frame.pack(pady=(10,0), padx=10, fill='x')
         
         ttk.Label(general_frame, text="Font Size").pack(pady=(5,0), padx=10, anchor='w')
-        font_slider = ttk.Scale(general_frame, from_=8, to=24, command=lambda s: self.settings.update({"font_size": int(float(s))}))
-        font_slider.set(self.settings["font_size"])
-        font_slider.pack(fill="x", padx=10)
+        self.font_slider = ttk.Scale(general_frame, from_=8, to=24, command=lambda s: self.update_settings({"font_size": int(float(s))}))
+        self.font_slider.pack(fill="x", padx=10)
         
         ttk.Label(general_frame, text="Background Alpha").pack(pady=(5,0), padx=10, anchor='w')
-        alpha_slider = ttk.Scale(general_frame, from_=0.1, to=1.0, command=lambda s: self.settings.update({"alpha": float(s)}))
-        alpha_slider.set(self.settings["alpha"])
-        alpha_slider.pack(fill="x", padx=10)
+        self.alpha_slider = ttk.Scale(general_frame, from_=0.1, to=1.0, command=lambda s: self.update_settings({"alpha": round(float(s), 2)}))
+        self.alpha_slider.pack(fill="x", padx=10)
         
         ttk.Label(general_frame, text="Color Theme").pack(pady=(5,0), padx=10, anchor='w')
-        theme_var = tk.StringVar(value=self.settings.get("theme", "標準 (灰色)"))
+        theme_var = self.settings_vars["theme"] = tk.StringVar()
         theme_combo = ttk.Combobox(general_frame, textvariable=theme_var, values=list(COLOR_THEMES.keys()), state='readonly')
         theme_combo.pack(fill="x", padx=10)
         
         ttk.Label(general_frame, text="Update Interval (sec)").pack(pady=(5,0), padx=10, anchor='w')
-        interval_var = tk.StringVar(value=self.settings.get("update_interval", 2.0))
+        interval_var = self.settings_vars["update_interval"] = tk.StringVar()
         interval_combo = ttk.Combobox(general_frame, textvariable=interval_var, values=[0.5, 1.0, 1.5, 2.0, 5.0], state='readonly')
         interval_combo.pack(fill="x", padx=10, pady=(0, 5))
 
         ttk.Label(general_frame, text="Hotkey").pack(pady=(5,0), padx=10, anchor='w')
-        hotkey_var = tk.StringVar(value=self.settings["hotkey"])
+        hotkey_var = self.settings_vars["hotkey"] = tk.StringVar()
         ttk.Entry(general_frame, textvariable=hotkey_var).pack(fill="x", padx=10)
         
-        time_format_var = tk.BooleanVar(value=self.settings.get("time_format") == "12h")
+        time_format_var = self.settings_vars["time_format"] = tk.BooleanVar()
         ttk.Checkbutton(general_frame, text="Use 12h Format (AM/PM)", variable=time_format_var).pack(pady=5, padx=10, anchor='w')
 
-        maintenance_frame = ttk.LabelFrame(self.settings_window, text="Maintenance")
-        maintenance_frame.pack(pady=(10,0), padx=20, fill='x')
+        spike_var = self.settings_vars["spike_capture"] = tk.BooleanVar()
+        ttk.Checkbutton(general_frame, text="Stutter Detector (Spike Capture)", variable=spike_var).pack(pady=(0, 5), padx=10, anchor='w')
+
+        record_var = self.settings_vars["record_sessions"] = tk.BooleanVar()
+        ttk.Checkbutton(general_frame, text="Record Sessions", variable=record_var).pack(pady=(0, 5), padx=10, anchor='w')
+
+        export_http_var = self.settings_vars["export_http"] = tk.BooleanVar()
+        ttk.Checkbutton(general_frame, text="Local Metrics Export (HTTP)", variable=export_http_var).pack(pady=(0, 5), padx=10, anchor='w')
+        export_shm_var = self.settings_vars["export_shared_memory"] = tk.BooleanVar()
+        ttk.Checkbutton(general_frame, text="Shared Memory Export", variable=export_shm_var).pack(pady=(0, 5), padx=10, anchor='w')
+        host_viewer_var = self.settings_vars["host_viewer"] = tk.BooleanVar()
+        ttk.Checkbutton(general_frame, text="Multi-Host Viewer (remote agents)", variable=host_viewer_var).pack(pady=(0, 5), padx=10, anchor='w')
+
+        alerts_frame = ttk.LabelFrame(alerts_page, text="Alerts")
+        alerts_frame.pack(pady=(10,0), padx=10, fill='x')
+        alerts_var = self.settings_vars["alerts_enabled"] = tk.BooleanVar()
+        ttk.Checkbutton(alerts_frame, text="Threshold Alerts", variable=alerts_var).pack(pady=(5, 0), padx=10, anchor='w')
+        alert_notify_var = self.settings_vars["alert_notifications"] = tk.BooleanVar()
+        ttk.Checkbutton(alerts_frame, text="Tray Notifications", variable=alert_notify_var).pack(padx=10, anchor='w')
+        alert_background_var = self.settings_vars["alert_background"] = tk.BooleanVar()
+        ttk.Checkbutton(alerts_frame, text="Notify While Hidden", variable=alert_background_var).pack(padx=10, anchor='w')
+        alert_help = "One rule per line:\n<metric> >|< <value> [for <sec>] [clear <value>] [warn|crit] [notify]\nMetrics: " + ", ".join(ALERT_METRICS) + " (net in Mbit/s)\nWith 'Notify While Hidden', the metrics of notify rules keep sampling at a reduced rate while the overlay is hidden."
+        ttk.Label(alerts_frame, text=alert_help, wraplength=260).pack(pady=5, padx=10, anchor='w')
+        self.alert_rules_text = tk.Text(alerts_frame, height=8, width=30, bg='#555555', fg='white', insertbackground='white', relief='flat', font=("Consolas", 9))
+        self.alert_rules_text.pack(fill="x", padx=10, pady=(0, 10))
+
+        maintenance_frame = ttk.LabelFrame(maintenance_page, text="Maintenance")
+        maintenance_frame.pack(pady=(10,0), padx=10, fill='x')
         
-        instruction_text = "You can manually change the process priority to prioritize game performance."
-        ttk.Label(maintenance_frame, text=instruction_text, wraplength=250).pack(pady=5, padx=10)
+        instruction_text = "Game rules raise a game's priority while it runs; bg rules lower background processes while a game is running."
+        ttk.Label(maintenance_frame, text=instruction_text, wraplength=260).pack(pady=5, padx=10)
+
+        priority_var = self.settings_vars["priority_manager"] = tk.BooleanVar()
+        ttk.Checkbutton(maintenance_frame, text="Automatic Priority Manager", variable=priority_var).pack(padx=10, anchor='w')
+        ttk.Label(maintenance_frame, text="Rules: game|bg <pattern> <priority> [cpus]").pack(pady=(5,0), padx=10, anchor='w')
+        self.priority_rules_text = tk.Text(maintenance_frame, height=5, width=30, bg='#555555', fg='white', insertbackground='white', relief='flat', font=("Consolas", 9))
+        self.priority_rules_text.pack(fill="x", padx=10)
+        self.priority_status = ttk.Label(maintenance_frame, text="", wraplength=260)
+        self.priority_status.pack(pady=(0, 5), padx=10, anchor='w')
         
         taskmgr_button = ttk.Button(maintenance_frame, text="Open Task Manager", command=self.open_task_manager, style='TButton')
         taskmgr_button.pack(pady=5, padx=10, fill='x')
 
         cleanup_button = ttk.Button(maintenance_frame, text="Clean Temp Files", command=self.run_cleanup_in_thread, style='TButton')
-        cleanup_button.pack(pady=(5,10), padx=10, fill='x')
+        cleanup_button.pack(pady=(5,0), padx=10, fill='x')
+
+        self.cleanup_progress = ttk.Progressbar(maintenance_frame, mode='determinate', maximum=100)
+        self.cleanup_progress.pack(pady=(5,0), padx=10, fill='x')
+        self.cleanup_status = ttk.Label(maintenance_frame, text="")
+        self.cleanup_status.pack(padx=10, anchor='w')
+        self.cleanup_cancel_button = ttk.Button(maintenance_frame, text="Cancel Cleanup", command=self.cancel_cleanup, style='TButton', state='normal' if self.cleaner else 'disabled')
+        self.cleanup_cancel_button.pack(pady=(0,10), padx=10, fill='x')
         #make byまそん
-        def save_and_apply():
-            new_hotkey = hotkey_var.get()
-            if self.settings["hotkey"] != new_hotkey:
-                self.settings["hotkey"] = new_hotkey
-                messagebox.showinfo("Hotkey Changed", "Restart the app to apply the new hotkey.", parent=self.settings_window)
-            self.settings["time_format"] = "12h" if time_format_var.get() else "24h"
-            self.settings["show_cpu"] = show_vars["cpu"].get()
-            self.settings["show_ram"] = show_vars["ram"].get()
-            self.settings["show_temp"] = show_vars["temp"].get()
-            self.settings["show_network"] = show_vars["network"].get()
-            self.settings["show_battery"] = show_vars["battery"].get()
-            self.settings["show_voltage"] = show_vars["voltage"].get()
-            self.settings["show_amperage"] = show_vars["amperage"].get()
-            self.settings["show_time"] = show_vars["time"].get()
-            self.settings["theme"] = theme_var.get()
-            self.settings["update_interval"] = float(interval_var.get())
-            self.apply_settings()
-            self.save_settings()
-            self.settings_window.destroy()
-
-        save_button = ttk.Button(self.settings_window, text="Save & Close", command=save_and_apply, style='TButton')
+        save_button = ttk.Button(self.settings_window, text="Save & Close", command=self.save_and_apply, style='TButton')
         save_button.pack(pady=(10, 10), padx=20, fill='x')
 
+    def save_and_apply(self):
+        rule_lines = [line.strip() for line in self.priority_rules_text.get("1.0", tk.END).splitlines() if line.strip()]
+        alert_lines = [line.strip() for line in self.alert_rules_text.get("1.0", tk.END).splitlines() if line.strip()]
+        try:
+            for line in rule_lines: parse_priority_rule(line)
+            for line in alert_lines: parse_alert_rule(line)
+        except ValueError as e:
+            messagebox.showerror("Invalid Rule", str(e), parent=self.settings_window)
+            return
+        changes = {"priority_rules": rule_lines, "alert_rules": alert_lines}
+        for key, var in self.settings_vars.items():
+            value = var.get()
+            if key == "time_format": value = "12h" if value else "24h"
+            elif key == "update_interval": value = float(value)
+            elif key in ("nic_filter", "hotkey"): value = value.strip()
+            changes[key] = value
+        if changes["hotkey"] != self.settings["hotkey"]:
+            try: self.setup_hotkey_listener(changes["hotkey"])
+            except ValueError as e:
+                messagebox.showerror("Invalid Hotkey", f"{changes['hotkey']}: {e}", parent=self.settings_window)
+                return
+        self.update_settings(changes, delay=0)
+        self.settings_window.withdraw()
+
     def setup_tray_icon(self):
-        try: image = Image.open(ICON_PATH)
-        except:
-            image = Image.new("RGB", (64, 64), "black")
-            ImageDraw.Draw(image).text((10, 20), "EC", fill="red")
-        menu = (item('Toggle Overlay', self.toggle_overlay), item('Exit', self.quit_app))
+        from pystray import MenuItem as item, Icon
+        image = self.get_icon_image()
+        menu = (item('Toggle Overlay', self.request_toggle),
+                item('Replay Last Session', lambda: self.root and self.root.after(0, self.start_replay)),
+                item('Export Last Session (CSV)', lambda: self.root and self.root.after(0, self.export_last_session)),
+                item('Debug Stats', lambda: self.root and self.root.after(0, self.toggle_debug), checked=lambda _: self.settings.get("show_debug", False)),
+                item('Exit', self.quit_app))
         self.icon = Icon("EvlonClient", image, "EvlonClient", menu)
-        self.icon.run()
+        self.icon.run(setup=self.on_tray_ready)
 
-    def setup_hotkey_listener(self):
-        self.hotkey_listener = keyboard.GlobalHotKeys({self.settings["hotkey"]: self.toggle_overlay})
-        self.hotkey_listener.start()
+    def on_tray_ready(self, icon):
+        icon.visible = True
+        self.mark_startup("tray_ready")
+
+    def setup_hotkey_listener(self, hotkey=None):
+        # The new listener is built before the old one stops, so an invalid hotkey keeps the current binding.
+        from pynput import keyboard
+        listener = keyboard.GlobalHotKeys({hotkey or self.settings["hotkey"]: self.request_toggle})
+        listener.name = "pynput-hotkeys"
+        listener.start()
+        if self.hotkey_listener: self.hotkey_listener.stop()
+        self.hotkey_listener = listener
 
     def run_tkinter_app(self):
         self.create_windows()
 
     def quit_app(self):
+        if self.changed_settings: self.save_settings()
+        self.settings_store.flush()
+        self.engine.stop()
+        self.spike_detector.stop()
+        if self.recorder: self.recorder.close(); self.recorder.wait()
+        if self.exporter: self.exporter.stop()
+        if self.shared_block: self.shared_block.close()
+        if self.priority_manager: self.priority_manager.stop()
+        if self.host_viewer: self.host_viewer.stop()
         if self.hotkey_listener: self.hotkey_listener.stop()
         if self.icon: self.icon.stop()
         if self.root: self.root.quit()
 
 if __name__ == "__main__":
-    app = ScreenOverlayApp()
-    app.setup_tray_icon()
+    import argparse
+    parser = argparse.ArgumentParser(description="EvlonClient system overlay")
+    parser.add_argument("--agent", nargs="?", const=f"127.0.0.1:{HOST_PORT}", metavar="HOST:PORT", help="run headless and send metrics to a multi-host viewer")
+    parser.add_argument("--name", help="host name reported in agent mode (default: computer name)")
+    args = parser.parse_args()
+    if args.agent:
+        ScreenOverlayApp(interactive=False).run_agent(args.agent, args.name)
+    else:
+        app = ScreenOverlayApp()
+        app.setup_tray_icon()
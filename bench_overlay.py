@@ -0,0 +1,273 @@
+#Headless benchmark for the EvlonClient update/render path.
+#Usage: python bench_overlay.py [--ticks 50] [--variants fast,slow,failing] [--flags show_cpu,...] [--interval-ticks 4]
+#                               [--output bench_results.json] [--compare old.json]
+#Every combination of --flags (default: all SHOW_FLAGS, 4096 combinations) is benchmarked; the other flags keep their defaults.
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+import types
+from collections import namedtuple
+import tkinter
+import EvlonClient
+
+SHOW_FLAGS = ("show_cpu", "show_ram", "show_temp", "show_network", "show_battery", "show_voltage", "show_amperage", "show_throttle",
+              "show_time", "show_graphs", "show_details", "show_debug")
+INTERVALS = (0.5, 1.0, 1.5, 2.0, 5.0)
+
+class NoopWidget:
+    _next_id = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _create(self, *args, **kwargs):
+        NoopWidget._next_id += 1
+        return NoopWidget._next_id
+
+    def _zero(self, *args, **kwargs):
+        return 0
+
+    def _none(self, *args, **kwargs):
+        return None
+
+    def __getattr__(self, name):
+        if name.startswith("create_") or name == "after": return self._create
+        if name.startswith("winfo_") or name in ("cget", "measure"): return self._zero
+        return self._none
+
+def noop_tk_backend():
+    backend = types.SimpleNamespace(**{name: getattr(tkinter, name) for name in dir(tkinter) if not name.startswith("_")})
+    for name in ("Tk", "Toplevel", "Frame", "Label", "Canvas", "Text"):
+        setattr(backend, name, NoopWidget)
+    backend.font = types.SimpleNamespace(Font=NoopWidget)
+    return backend
+
+Temp = namedtuple("Temp", "label current high critical")
+Battery = namedtuple("Battery", "percent secsleft power_plugged")
+NetCounters = namedtuple("NetCounters", "bytes_sent bytes_recv packets_sent packets_recv")
+CpuTimes = namedtuple("CpuTimes", "user nice system idle iowait irq softirq steal guest guest_nice")
+CpuFreq = namedtuple("CpuFreq", "current min max")
+Memory = namedtuple("Memory", "total available percent")
+MemoryInfo = namedtuple("MemoryInfo", "rss vms")
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+
+    def oneshot(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cpu_percent(self, interval=None):
+        return 0.3
+
+    def memory_info(self):
+        return MemoryInfo(40 * 1024 * 1024, 80 * 1024 * 1024)
+
+    def num_threads(self):
+        return 8
+
+    def name(self):
+        return f"proc{self.pid}.exe"
+
+class FakePsutil:
+    # Deterministic psutil stand-in. sensor_delay slows the sensor calls, fail makes them raise.
+    NoSuchProcess = AccessDenied = RuntimeError
+
+    def __init__(self, cores=8, nics=3, sensor_delay=0.0, fail=False):
+        self.cores = cores
+        self.nics = [f"nic{i}" for i in range(nics)]
+        self.sensor_delay = sensor_delay
+        self.fail = fail
+        self.calls = 0
+
+    def _tick(self):
+        self.calls += 1
+        return self.calls
+
+    def _sensor(self):
+        if self.sensor_delay: time.sleep(self.sensor_delay)
+        if self.fail: raise OSError("sensor unavailable")
+
+    def cpu_percent(self, interval=None, percpu=False):
+        n = self._tick()
+        return [float((n * 7 + i * 13) % 100) for i in range(self.cores)] if percpu else float(n * 7 % 100)
+
+    def virtual_memory(self):
+        return Memory(16 * 1024 ** 3, 8 * 1024 ** 3, float(40 + self._tick() % 20))
+
+    def sensors_temperatures(self):
+        self._sensor()
+        return {"coretemp": [Temp("Package id 0", 55.0 + self._tick() % 10, 90.0, 100.0)]}
+
+    def sensors_battery(self):
+        self._sensor()
+        return Battery(80, 3600, True)
+
+    def net_io_counters(self, pernic=False):
+        if self.fail: raise OSError("net unavailable")
+        n = self._tick()
+        if pernic: return {name: NetCounters(n * 1000 * (i + 1), n * 5000 * (i + 1), n, n) for i, name in enumerate(self.nics)}
+        return NetCounters(n * 1000, n * 5000, n, n)
+
+    def cpu_times(self, percpu=False):
+        n = self._tick()
+        times = [CpuTimes(n * (i + 1), 0, n, n * 3, 0, 0, 0, 0, 0, 0) for i in range(self.cores)]
+        return times if percpu else times[0]
+
+    def cpu_freq(self, percpu=False):
+        freqs = [CpuFreq(3400.0, 800.0, 4500.0)] * self.cores
+        return freqs if percpu else freqs[0]
+
+    def Process(self, pid=None):
+        return FakeProcess(pid or os.getpid())
+
+PROVIDERS = {
+    "fast": lambda: FakePsutil(),
+    "slow": lambda: FakePsutil(sensor_delay=0.04),
+    "failing": lambda: FakePsutil(fail=True),
+}
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"mean_us": statistics.fmean(ordered) * 1e6, "p50_us": pick(0.5) * 1e6, "p95_us": pick(0.95) * 1e6,
+            "p99_us": pick(0.99) * 1e6, "max_us": ordered[-1] * 1e6}
+
+def build_app(provider):
+    EvlonClient.tk = noop_tk_backend()
+    app = EvlonClient.ScreenOverlayApp(provider=provider, settings=dict(EvlonClient.DEFAULT_SETTINGS), interactive=False)
+    app.sync_alerts()
+    app.create_windows()
+    for collector in app.engine.collectors.values():
+        # Keep samples readable while the engine is paused for the allocation pass.
+        collector.timeout = 1e9
+    app.engine.set_interval(0.05)
+    app.engine.resume()
+    app.current_state = 1
+    return app
+
+def bench_combo(app, flags, ticks):
+    app.settings.update(flags)
+    app.engine.configure(app.settings)
+    started = time.perf_counter()
+    app.apply_settings()
+    apply_time = time.perf_counter() - started
+    for _ in range(10): app.tick()
+    samples = []
+    for _ in range(ticks):
+        started = time.perf_counter()
+        app.tick()
+        samples.append(time.perf_counter() - started)
+    app.engine.pause()
+    tracemalloc.start()
+    peaks = []
+    before = tracemalloc.take_snapshot()
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        app.tick()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    app.engine.resume()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    latency = percentiles(samples)
+    return {
+        "flags": dict(flags),
+        "tick": latency,
+        "apply_settings_us": apply_time * 1e6,
+        "alloc_peak_bytes_per_tick": statistics.fmean(peaks),
+        "retained_blocks_per_tick": blocks / ticks,
+    }
+
+def bench_intervals(app, ticks):
+    # Drives the collectors and the tick at each real update interval and measures what that costs.
+    results = []
+    for interval in INTERVALS:
+        app.settings.update(update_interval=interval, min_update_interval=min(INTERVALS))
+        app.refresh_interval()
+        time.sleep(interval)
+        next_time = wall_started = time.perf_counter()
+        cpu_started, tick_cpu = time.process_time(), 0.0
+        for _ in range(ticks):
+            delay = next_time - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            started = time.thread_time()
+            app.tick()
+            tick_cpu += time.thread_time() - started
+            next_time += interval
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+        wall = time.perf_counter() - wall_started
+        results.append({"update_interval": interval, "ticks_per_second": ticks / wall,
+                        "tick_cpu_fraction": tick_cpu / wall, "process_cpu_fraction": (time.process_time() - cpu_started) / wall})
+    return results
+
+def bench_format_speed(app, rounds=20000):
+    values = [0.0, 800.0, 64_000.0, 9_000_000.0, 800_000_000.0]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for value in values: app.format_speed(value)
+    return {"calls": rounds * len(values), "per_call_ns": (time.perf_counter() - started) / (rounds * len(values)) * 1e9}
+
+def run(variants, ticks, flag_names=SHOW_FLAGS, interval_ticks=4):
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(), "ticks": ticks,
+                        "flags": list(flag_names), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}, "variants": {}}
+    for variant in variants:
+        app = build_app(PROVIDERS[variant]())
+        time.sleep(0.2)
+        if "format_speed" not in results: results["format_speed"] = bench_format_speed(app)
+        combos = []
+        for values in itertools.product((False, True), repeat=len(flag_names)):
+            combos.append(bench_combo(app, dict(zip(flag_names, values)), ticks))
+        app.settings.update({name: True for name in flag_names})
+        app.engine.configure(app.settings)
+        app.apply_settings()
+        intervals = bench_intervals(app, interval_ticks) if interval_ticks else []
+        app.engine.stop()
+        p95 = [combo["tick"]["p95_us"] for combo in combos]
+        results["variants"][variant] = {"summary": {"worst_p95_us": max(p95), "median_p95_us": statistics.median(p95)},
+                                        "intervals": intervals, "combos": combos}
+        print(f"{variant:<8} median p95 {statistics.median(p95):8.1f} us  worst p95 {max(p95):8.1f} us")
+    return results
+
+def compare(old, new):
+    for variant, data in new["variants"].items():
+        if variant not in old.get("variants", {}): continue
+        before, now = old["variants"][variant]["summary"], data["summary"]
+        for key in ("median_p95_us", "worst_p95_us"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            print(f"{variant:<8} {key:<14} {before[key]:8.1f} -> {now[key]:8.1f} us ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EvlonClient update/render path without a display.")
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--variants", default=",".join(PROVIDERS))
+    parser.add_argument("--flags", default=",".join(SHOW_FLAGS), help="show_* flags to combine")
+    parser.add_argument("--interval-ticks", type=int, default=4, help="ticks per update interval in the throughput pass (0 skips it)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+    flag_names = tuple(name for name in args.flags.split(",") if name)
+    unknown = [name for name in flag_names if name not in SHOW_FLAGS]
+    if unknown: parser.error(f"unknown flags: {', '.join(unknown)}")
+    results = run([variant for variant in args.variants.split(",") if variant], args.ticks, flag_names, args.interval_ticks)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#Round-trip check for the multi-host agent/viewer protocol on localhost.
+#Usage: python check_multihost.py [--agents 3] [--seconds 3]
+import argparse
+import socket
+import sys
+import threading
+import time
+import EvlonClient
+from bench_overlay import FakePsutil
+
+failures = []
+
+def check(condition, message):
+    print(("ok    " if condition else "FAIL  ") + message)
+    if not condition: failures.append(message)
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(): return True
+        time.sleep(0.01)
+    return predicate()
+
+def snapshot(cpu, ram=40.0, temp=55.0, net=(1_000_000.0, 250_000.0), battery=80.0, plugged=True):
+    return {"cpu": cpu, "ram": ram, "temp": temp, "net": net, "battery": EvlonClient.BatteryState(battery, plugged)}
+
+def check_protocol():
+    viewer = EvlonClient.HostViewer(0, "127.0.0.1", stale_periods=3.0)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = ("127.0.0.1", viewer.port)
+    encoders = {name: EvlonClient.HostFrameEncoder(name, 0.5, keyframe_every=4) for name in ("alpha", "beta")}
+    sent = dict.fromkeys(encoders, 0)
+    try:
+        for frame in range(9):
+            for name, encoder in encoders.items():
+                base = time.time()
+                data = encoder.encode([(base, snapshot(frame * 10.0)), (base + 0.5, snapshot(frame * 10.0 + 5.0, temp=None))])
+                # Frame 2 of alpha is lost in transit; frame 3 (a delta) must be ignored until keyframe 4 arrives.
+                if name == "alpha" and frame == 2: continue
+                sender.sendto(data, address)
+                sent[name] += 1
+            wait_for(lambda: all(name in viewer.hosts and viewer.hosts[name].frames == count for name, count in sent.items()))
+            alpha = viewer.hosts.get("alpha")
+            if frame == 3: check(alpha is not None and alpha.seq is None and alpha.latest[1]["cpu"] == 15.0, "alpha ignores deltas after a lost datagram")
+            if frame == 4: check(alpha.seq == 4 and alpha.latest[1]["cpu"] == 45.0, "alpha resyncs on the next keyframe")
+        wait_for(lambda: viewer.hosts["alpha"].seq == 8 and viewer.hosts["beta"].seq == 8)
+        rows = {name: (remote, age, stale) for name, remote, age, stale in viewer.snapshot()}
+        check(sorted(rows) == ["alpha", "beta"], "viewer tracks both host names")
+        beta = rows["beta"][0]
+        check(beta["cpu"] == 85.0 and beta["ram"] == 40.0 and beta["temp"] is None, "beta decodes the last sample, including a missing field")
+        check(beta["net"] == (1_000_000.0, 250_000.0) and beta["battery"] == EvlonClient.BatteryState(80.0, True), "net and battery survive quantization")
+        check(viewer.hosts["alpha"].resyncs == 1 and viewer.hosts["beta"].resyncs == 0, "only alpha needed a resync")
+        check(not any(stale for _, _, stale in rows.values()), "fresh hosts are not stale")
+        later = time.monotonic() + 3.5
+        check(all(stale for _, _, _, stale in viewer.snapshot(later)), "hosts turn stale after 3 silent frame periods")
+        stranger = EvlonClient.HostFrameEncoder("gamma", 0.5).encode([(time.time(), snapshot(1.0))])
+        viewer.max_hosts = 2
+        try:
+            viewer.receive(stranger, address, time.monotonic())
+            check(False, "a third host is refused at max_hosts=2")
+        except ValueError: check("gamma" not in viewer.hosts, "a third host is refused at max_hosts=2")
+        viewer.forget(time.monotonic() + viewer.forget_after + 1)
+        check(not viewer.hosts, "hosts silent for forget_after are dropped")
+        sizes = [len(encoders["beta"].encode([(time.time(), snapshot(50.0)), (time.time() + 0.5, snapshot(50.0))])) for _ in range(4)]
+        print(f"      frame bytes (keyframe, deltas): {sizes}")
+    finally:
+        sender.close()
+        viewer.stop()
+
+def check_agents(count, seconds):
+    viewer = EvlonClient.HostViewer(0, "127.0.0.1", stale_periods=3.0)
+    stops, threads, agents = [], [], {}
+    try:
+        for index in range(count):
+            settings = dict(EvlonClient.DEFAULT_SETTINGS)
+            app = EvlonClient.ScreenOverlayApp(provider=FakePsutil(), settings=settings, interactive=False)
+            stop = threading.Event()
+            name = f"agent{index}"
+            thread = threading.Thread(target=lambda app=app, stop=stop, name=name: agents.__setitem__(name, app.run_agent(f"127.0.0.1:{viewer.port}", name, stop)))
+            thread.start()
+            stops.append(stop)
+            threads.append(thread)
+        time.sleep(seconds)
+        rows = {name: stale for name, _, _, stale in viewer.snapshot()}
+        check(sorted(rows) == [f"agent{index}" for index in range(count)], f"viewer sees all {count} agents")
+        check(not any(rows.values()), "no running agent is stale")
+        stops[0].set()
+        time.sleep(3.5 * viewer.hosts["agent0"].period)
+        rows = {name: stale for name, _, _, stale in viewer.snapshot()}
+        check(rows["agent0"] and not any(stale for name, stale in rows.items() if name != "agent0"), "a stopped agent turns stale, the others stay fresh")
+    finally:
+        for stop in stops: stop.set()
+        for thread in threads: thread.join()
+        viewer.stop()
+    for name, agent in sorted(agents.items()):
+        print(f"      {name}: {agent.frames_sent} frames, {agent.bytes_sent / max(1, agent.frames_sent):.1f} bytes/frame")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the EvlonClient multi-host protocol against a viewer on localhost.")
+    parser.add_argument("--agents", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    check_protocol()
+    if args.agents: check_agents(args.agents, args.seconds)
+    print(f"{len(failures)} failure(s)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()